@@ -0,0 +1,11 @@
+"""
+Shared FastAPI dependencies for the API routers.
+"""
+from typing import Dict, Any
+
+from fastapi import Request
+
+
+def get_config(request: Request) -> Dict[str, Any]:
+    """Application config, loaded once at startup by the lifespan handler."""
+    return request.app.state.config
@@ -1,15 +1,24 @@
 """
 Result retrieval API endpoint.
 """
-from fastapi import APIRouter, HTTPException
+from pathlib import Path
+from typing import Dict, Any
+
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import FileResponse
 
 from ..services.job_store import job_store
+from .dependencies import get_config
 
 router = APIRouter()
 
+# Completed results never change, so clients may reuse them without revalidating.
+# Kept private because results are per-student data.
+RESULT_CACHE_CONTROL = "private, max-age=86400, immutable"
+
 
 @router.get("/result/{job_id}")
-async def get_result(job_id: str):
+async def get_result(job_id: str, config: Dict[str, Any] = Depends(get_config)):
     """
     Get the evaluation result for a completed job.
     
@@ -32,6 +41,16 @@ async def get_result(job_id: str):
             detail=f"Job failed: {job.get('error', 'Unknown error')}"
         )
     
+    # Serve the saved result file as-is: no parse and re-encode of the JSON
+    outputs_dir = Path(config.get("paths", {}).get("outputs", "./outputs"))
+    result_file = outputs_dir / f"{job_id}_result.json"
+    if result_file.is_file():
+        return FileResponse(
+            result_file,
+            media_type="application/json",
+            headers={"Cache-Control": RESULT_CACHE_CONTROL}
+        )
+    
     result = job_store.get_result(job_id)
     
     if result is None:
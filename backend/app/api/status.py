@@ -1,26 +1,71 @@
 """
 Job status API endpoint with exam mode support and resume functionality.
 """
-import asyncio
+import os
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Query
+from typing import Dict, Any, Optional, Tuple
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 
 from ..schemas.output_schema import JobStatus, ResumeResponse
 from ..services.job_store import job_store
 from ..services.checkpoint_service import CheckpointService
-from ..services.llm_evaluator import resume_evaluation, load_config
+from ..services.llm_evaluator import run_resume_task, get_checkpoints_dir
 
 router = APIRouter()
 
+# Job statuses that /resume may move back to processing
+RESUMABLE_STATUSES = frozenset({"failed"})
 
-def run_async_resume(job_id: str, exam_mode: Optional[str] = None):
-    """Wrapper to run async resume in a new event loop."""
-    asyncio.run(resume_evaluation(job_id, exam_mode))
+# Parsed checkpoints are reused for this long while the file is unchanged
+CHECKPOINT_CACHE_TTL = 0.5
+
+# Jobs kept in the checkpoint cache; the least recently polled is evicted first
+CHECKPOINT_CACHE_MAX_JOBS = 256
+
+# job_id -> (summary mtime_ns, job version, checkpoint summary, fetched_at)
+_checkpoint_cache: "OrderedDict[str, Tuple[int, int, Optional[Dict[str, Any]], float]]" = OrderedDict()
+
+
+async def load_checkpoint_summary_cached(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a job's checkpoint summary for polling endpoints, reusing the last
+    parse when the file has not changed, the job has not been updated and the
+    entry is younger than CHECKPOINT_CACHE_TTL. Reads run in the threadpool.
+    """
+    checkpoint = CheckpointService(job_id, get_checkpoints_dir())
+    # Checkpoints written before summaries existed are summarized on load
+    source_file = checkpoint.summary_file if checkpoint.summary_file.exists() else checkpoint.checkpoint_file
+    try:
+        mtime_ns = os.stat(source_file).st_mtime_ns
+    except FileNotFoundError:
+        _checkpoint_cache.pop(job_id, None)
+        return None
+    
+    version = job_store.get_version(job_id)
+    cached = _checkpoint_cache.get(job_id)
+    if (
+        cached is not None
+        and cached[0] == mtime_ns
+        and cached[1] == version
+        and time.monotonic() - cached[3] < CHECKPOINT_CACHE_TTL
+    ):
+        _checkpoint_cache.move_to_end(job_id)
+        return cached[2]
+    
+    data = await run_in_threadpool(checkpoint.load_summary)
+    # Stamp after the load so the entry's age covers the full read
+    _checkpoint_cache[job_id] = (mtime_ns, version, data, time.monotonic())
+    _checkpoint_cache.move_to_end(job_id)
+    while len(_checkpoint_cache) > CHECKPOINT_CACHE_MAX_JOBS:
+        _checkpoint_cache.popitem(last=False)
+    return data
 
 
 @router.get("/status/{job_id}", response_model=JobStatus)
-async def get_job_status(job_id: str):
+async def get_job_status(job_id: str, request: Request, response: Response):
     """
     Get the status of an evaluation job with detailed progress.
     
@@ -30,32 +75,38 @@ async def get_job_status(job_id: str):
         - exam_mode: Detected/specified exam mode
         - completed_sections: List of evaluated sections
         - error: Error message if failed
+    
+    Sends a weak ETag; polls with a matching If-None-Match get 304 Not Modified.
     """
     job = job_store.get_job(job_id)
     
     if job is None:
         raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
     
-    # Get additional progress from checkpoint
-    config = load_config()
-    checkpoint = CheckpointService(job_id, config.get("paths", {}).get("checkpoints", "./checkpoints"))
-    checkpoint_data = checkpoint.load()
+    # Get additional progress from checkpoint summary
+    summary = await load_checkpoint_summary_cached(job_id)
     
     stage = None
     completed_sections = []
     exam_mode = None
     
-    if checkpoint_data:
-        stage = checkpoint_data.get("stage")
-        completed_sections = checkpoint_data.get("completed_sections", [])
-        # Try to get mode from final result or section results
-        if "final_result" in checkpoint_data:
-            exam_mode = checkpoint_data["final_result"].get("exam_mode")
-        elif completed_sections:
-            first_section = checkpoint_data.get("section_results", {}).get(completed_sections[0], {})
-            exam_mode = first_section.get("mode")
-    
-    return JobStatus(
+    if summary:
+        stage = summary.get("stage")
+        completed_sections = summary.get("completed_sections", [])
+        exam_mode = summary.get("exam_mode")
+    
+    # Unchanged job + checkpoint progress means an unchanged body
+    checkpoint_updated_at = summary.get("updated_at") if summary else None
+    etag = f'W/"{job.get("updated_at_ns")}-{checkpoint_updated_at}-{len(completed_sections)}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    
+    job = job_store.to_dict(job)
+    
+    # Fields come from job_store and the checkpoint, so skip re-validation
+    return JobStatus.model_construct(
         job_id=job["job_id"],
         status=job["status"],
         stage=stage,
@@ -84,17 +135,6 @@ async def resume_job(
         job_id: Job ID to resume
         exam_mode: Optional override for exam mode (PT-1 or PT-2)
     """
-    job = job_store.get_job(job_id)
-    
-    if job is None:
-        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
-    
-    if job["status"] == "completed":
-        raise HTTPException(status_code=400, detail="Job already completed")
-    
-    if job["status"] == "processing":
-        raise HTTPException(status_code=400, detail="Job is already processing")
-    
     # Validate exam mode if provided
     if exam_mode and exam_mode not in ["PT-1", "PT-2"]:
         raise HTTPException(
@@ -102,10 +142,12 @@ async def resume_job(
             detail=f"Invalid exam mode '{exam_mode}'. Must be 'PT-1' or 'PT-2'."
         )
     
+    if job_store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    
     # Check if checkpoint exists
-    config = load_config()
-    checkpoint = CheckpointService(job_id, config.get("paths", {}).get("checkpoints", "./checkpoints"))
-    checkpoint_data = checkpoint.load()
+    checkpoint = CheckpointService(job_id, get_checkpoints_dir())
+    checkpoint_data = await run_in_threadpool(checkpoint.load)
     
     if not checkpoint_data:
         raise HTTPException(
@@ -115,13 +157,19 @@ async def resume_job(
     
     current_stage = checkpoint_data.get("stage", "UNKNOWN")
     
-    # Update job status to processing
-    job_store.update_job(job_id, "processing", error=None)
+    # Claim the job in one step so concurrent resume requests cannot both start it
+    if job_store.transition(job_id, RESUMABLE_STATUSES, "processing") is None:
+        job = job_store.get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+        if job["status"] == "completed":
+            raise HTTPException(status_code=400, detail="Job already completed")
+        raise HTTPException(status_code=400, detail="Job is already processing")
     
-    # Start background resume task
-    background_tasks.add_task(run_async_resume, job_id, exam_mode)
+    # Start background resume task (scheduled on the server's event loop)
+    background_tasks.add_task(run_resume_task, job_id)
     
-    return ResumeResponse(
+    return ResumeResponse.model_construct(
         job_id=job_id,
         status="processing",
         message=f"Resuming evaluation from checkpoint" + (f" with mode {exam_mode}" if exam_mode else ""),
@@ -134,30 +182,20 @@ async def get_checkpoint_details(job_id: str):
     """
     Get detailed checkpoint information for debugging/monitoring.
     """
-    config = load_config()
-    checkpoint = CheckpointService(job_id, config.get("paths", {}).get("checkpoints", "./checkpoints"))
-    checkpoint_data = checkpoint.load()
+    summary = await load_checkpoint_summary_cached(job_id)
     
-    if not checkpoint_data:
+    if not summary:
         raise HTTPException(status_code=404, detail=f"No checkpoint for job '{job_id}'")
     
-    # Get exam mode from results
-    exam_mode = None
-    if "section_results" in checkpoint_data:
-        for section_data in checkpoint_data["section_results"].values():
-            if "mode" in section_data:
-                exam_mode = section_data["mode"]
-                break
-    
-    # Return sanitized checkpoint (without full OCR text to keep response small)
+    # The summary never carries OCR text, which keeps this response small
     return {
         "job_id": job_id,
-        "stage": checkpoint_data.get("stage"),
-        "exam_mode": exam_mode,
-        "completed_sections": checkpoint_data.get("completed_sections", []),
-        "has_ocr_texts": bool(checkpoint_data.get("ocr_texts")),
-        "has_structure": bool(checkpoint_data.get("structure")),
-        "section_results_available": list(checkpoint_data.get("section_results", {}).keys()),
-        "created_at": checkpoint_data.get("created_at"),
-        "updated_at": checkpoint_data.get("updated_at")
+        "stage": summary.get("stage"),
+        "exam_mode": summary.get("exam_mode"),
+        "completed_sections": summary.get("completed_sections", []),
+        "has_ocr_texts": summary.get("has_ocr_texts", False),
+        "has_structure": summary.get("has_structure", False),
+        "section_results_available": summary.get("section_results_available", []),
+        "created_at": summary.get("created_at"),
+        "updated_at": summary.get("updated_at")
     }
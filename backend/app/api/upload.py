@@ -3,27 +3,77 @@ File upload API endpoint.
 PT-II ONLY - No exam mode selection required.
 """
 import uuid
+import shutil
 import asyncio
 from pathlib import Path
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from typing import Dict, Any
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends
+from fastapi.concurrency import run_in_threadpool
 
 from ..schemas.output_schema import UploadResponse
 from ..services.job_store import job_store
-from ..services.llm_evaluator import run_evaluation_task, load_config
+from ..services.llm_evaluator import run_evaluation_task
+from .dependencies import get_config
 
 router = APIRouter()
 
+# Copy uploads to disk in 1 MiB chunks instead of buffering whole PDFs
+UPLOAD_CHUNK_SIZE = 1 << 20
 
-def run_async_evaluation(
-    job_id: str, 
-    question_path: str, 
-    answer_path: str, 
-    student_path: str
-):
+# Files uploaded per request (question paper, answer key, student sheet)
+UPLOAD_FILE_COUNT = 3
+
+# Content types browsers and HTTP clients send for PDFs; the magic check
+# below is what actually confirms the content
+PDF_CONTENT_TYPES = {"application/pdf", "application/x-pdf", "application/octet-stream"}
+PDF_MAGIC = b"%PDF"
+PDF_MAGIC_WINDOW = 1024
+
+
+def get_max_upload_bytes(config: Dict[str, Any]) -> int:
+    """Maximum size of a single uploaded file, from limits.max_upload_mb."""
+    return int(config.get("limits", {}).get("max_upload_mb", 25) * 1024 * 1024)
+
+
+async def _validate_pdf_upload(upload: UploadFile, max_bytes: int):
+    """
+    Reject a non-PDF or oversized upload before anything is written to disk.
+    Raises 413 for size and 415 for type; sniffs the %PDF header.
+    """
+    if upload.content_type not in PDF_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"File '{upload.filename}' has type '{upload.content_type}'. Only PDF files are accepted."
+        )
+    
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File '{upload.filename}' exceeds the {max_bytes // (1024 * 1024)} MB upload limit."
+        )
+    
+    head = await upload.read(PDF_MAGIC_WINDOW)
+    await upload.seek(0)
+    if PDF_MAGIC not in head:
+        raise HTTPException(
+            status_code=415,
+            detail=f"File '{upload.filename}' is not a valid PDF."
+        )
+
+
+def _copy_upload(upload: UploadFile, path: Path):
+    """Copy an uploaded file to disk chunk by chunk."""
+    upload.file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f, length=UPLOAD_CHUNK_SIZE)
+
+
+async def _save_stream(upload: UploadFile, path: Path):
     """
-    Wrapper to run async evaluation in a new event loop (for background thread).
+    Stream an uploaded file to disk without loading it into memory.
+    The blocking copy runs in the threadpool so the event loop stays free.
     """
-    asyncio.run(run_evaluation_task(job_id, question_path, answer_path, student_path))
+    await run_in_threadpool(_copy_upload, upload, path)
 
 
 @router.post("/upload", response_model=UploadResponse)
@@ -31,7 +81,8 @@ async def upload_files(
     background_tasks: BackgroundTasks,
     question_paper: UploadFile = File(..., description="Question paper PDF"),
     answer_key: UploadFile = File(..., description="Answer key PDF"),
-    student_sheet: UploadFile = File(..., description="Student answer sheet PDF")
+    student_sheet: UploadFile = File(..., description="Student answer sheet PDF"),
+    config: Dict[str, Any] = Depends(get_config)
 ):
     """
     Upload three PDF files for evaluation.
@@ -59,27 +110,34 @@ async def upload_files(
                 detail=f"File '{file.filename}' is not a PDF. Only PDF files are accepted."
             )
     
+    max_bytes = get_max_upload_bytes(config)
+    for file in [question_paper, answer_key, student_sheet]:
+        await _validate_pdf_upload(file, max_bytes)
+    
     # Generate job ID from student paper filename
     # Extract filename without extension and add "-result" suffix
     student_filename = Path(student_sheet.filename).stem  # e.g., "7376242AD231" from "7376242AD231.pdf"
     base_job_id = f"{student_filename}-result"
     
-    # Load config for paths
-    config = load_config()
+    # Paths from config
     uploads_dir = Path(config.get("paths", {}).get("uploads", "./uploads"))
     uploads_dir.mkdir(parents=True, exist_ok=True)
     
-    # Handle duplicate filenames by adding (1), (2), etc.
-    job_id = base_job_id
-    job_dir = uploads_dir / job_id
-    counter = 1
-    while job_dir.exists():
-        job_id = f"{base_job_id}({counter})"
+    # Create job directory, handling duplicate filenames by adding (1), (2), etc.
+    # Known jobs give the starting suffix, so re-uploads skip straight past
+    # earlier attempts; mkdir(exist_ok=False) still claims the name atomically,
+    # so concurrent uploads of the same student sheet never share a directory
+    counter = len(job_store.list_ids_with_prefix(base_job_id))
+    job_id = f"{base_job_id}({counter})" if counter else base_job_id
+    counter += 1
+    while True:
         job_dir = uploads_dir / job_id
-        counter += 1
-    
-    # Create job directory
-    job_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            job_dir.mkdir(exist_ok=False)
+            break
+        except FileExistsError:
+            job_id = f"{base_job_id}({counter})"
+            counter += 1
     
     # Save uploaded files
     question_path = job_dir / "question_paper.pdf"
@@ -87,33 +145,30 @@ async def upload_files(
     student_path = job_dir / "student_sheet.pdf"
     
     try:
-        with open(question_path, "wb") as f:
-            content = await question_paper.read()
-            f.write(content)
-        
-        with open(answer_path, "wb") as f:
-            content = await answer_key.read()
-            f.write(content)
-        
-        with open(student_path, "wb") as f:
-            content = await student_sheet.read()
-            f.write(content)
+        # Overlap the three disk writes
+        await asyncio.gather(*[
+            _save_stream(upload, path)
+            for upload, path in zip(
+                [question_paper, answer_key, student_sheet],
+                [question_path, answer_path, student_path]
+            )
+        ])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save files: {str(e)}")
     
     # Create job entry
     job_store.create_job(job_id)
     
-    # Start background evaluation task
+    # Start background evaluation task (scheduled on the server's event loop)
     background_tasks.add_task(
-        run_async_evaluation,
+        run_evaluation_task,
         job_id,
         str(question_path),
         str(answer_path),
         str(student_path)
     )
     
-    return UploadResponse(
+    return UploadResponse.model_construct(
         job_id=job_id,
         status="processing",
         message=f"PT-II evaluation started. Use /api/status/{job_id} to check progress.",
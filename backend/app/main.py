@@ -8,10 +8,16 @@ from pathlib import Path
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from .api import upload, status, result
+from .api.upload import get_max_upload_bytes, UPLOAD_FILE_COUNT
+from .services.llm_evaluator import load_config, close_http_clients
+from .services.ocr_service import shutdown_render_executor
 
 
 # Load environment variables
@@ -21,24 +27,19 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler for startup/shutdown tasks."""
-    # Startup: Create necessary directories
-    config_dir = Path(__file__).parent / "config"
+    # Startup: Load config once and share it with all routers
+    config = load_config()
+    app.state.config = config
     
-    # Load paths from config
-    import yaml
-    config_path = config_dir / "config.yaml"
-    if config_path.exists():
-        with open(config_path, encoding="utf-8") as f:
-            config = yaml.safe_load(f)
-        
-        uploads_dir = Path(config.get("paths", {}).get("uploads", "./uploads"))
-        outputs_dir = Path(config.get("paths", {}).get("outputs", "./outputs"))
-        
-        uploads_dir.mkdir(parents=True, exist_ok=True)
-        outputs_dir.mkdir(parents=True, exist_ok=True)
-        
-        print(f"[DIR] Uploads directory: {uploads_dir.absolute()}")
-        print(f"[DIR] Outputs directory: {outputs_dir.absolute()}")
+    # Create necessary directories
+    uploads_dir = Path(config.get("paths", {}).get("uploads", "./uploads"))
+    outputs_dir = Path(config.get("paths", {}).get("outputs", "./outputs"))
+    
+    uploads_dir.mkdir(parents=True, exist_ok=True)
+    outputs_dir.mkdir(parents=True, exist_ok=True)
+    
+    print(f"[DIR] Uploads directory: {uploads_dir.absolute()}")
+    print(f"[DIR] Outputs directory: {outputs_dir.absolute()}")
     
     # Check for API keys
     if not os.getenv("GROQ_API_KEY"):
@@ -57,6 +58,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("[SHUTDOWN] AI Exam Evaluation System shutting down...")
+    await close_http_clients()
+    shutdown_render_executor()
 
 
 # Create FastAPI application
@@ -64,7 +67,8 @@ app = FastAPI(
     title="AI Exam Evaluation System",
     description="Production-ready system for evaluating student exam papers using OCR and LLM",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS for frontend access
@@ -81,6 +85,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject uploads whose Content-Length exceeds the limit before the body is read.
+    
+    Plain ASGI rather than @app.middleware("http"): other requests (status
+    polls) pass straight through, and the upload's call isn't held open
+    while its background evaluation runs.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"] == "/api/upload"
+        ):
+            content_length = Headers(scope=scope).get("content-length", "")
+            max_bytes = get_max_upload_bytes(scope["app"].state.config) * UPLOAD_FILE_COUNT
+            if content_length.isdigit() and int(content_length) > max_bytes:
+                response = ORJSONResponse(
+                    status_code=413,
+                    content={"detail": "Upload exceeds the maximum allowed size."}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware)
+
+
 # Include API routers
 app.include_router(upload.router, prefix="/api", tags=["Upload"])
 app.include_router(status.router, prefix="/api", tags=["Status"])
@@ -3,7 +3,7 @@ Pydantic schemas for Anna University exam evaluation.
 Uses exact output format from master specification.
 """
 from typing import Dict, List, Optional, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from enum import Enum
 
 
@@ -76,6 +76,60 @@ class EvaluationResult(BaseModel):
     overall_feedback: str = Field("", description="Overall feedback")
 
 
+# ============ Holistic Evaluation Schemas ============
+
+HOLISTIC_SECTION_MAX = {"A": 10, "B": 20, "C": 20}
+
+
+class HolisticQuestionResult(BaseModel):
+    """Marks for a single question in the holistic LLM output."""
+    awarded: float = Field(..., ge=0, description="Marks awarded")
+    max: float = Field(..., ge=0, description="Maximum marks for the question")
+    remarks: str = Field("", description="Examiner remarks")
+    
+    @model_validator(mode="after")
+    def check_awarded(self) -> "HolisticQuestionResult":
+        if self.awarded > self.max:
+            raise ValueError(f"awarded {self.awarded} exceeds max {self.max}")
+        return self
+
+
+class SectionResult(BaseModel):
+    """One section of the holistic LLM output."""
+    questions: Dict[str, HolisticQuestionResult] = Field(default_factory=dict)
+    retained: List[str] = Field(default_factory=list)
+    section_total: float = Field(..., ge=0, description="Total of retained questions")
+
+
+class HolisticSummary(BaseModel):
+    """Final summary block of the holistic LLM output."""
+    total_marks: float = Field(..., ge=0, le=50, description="Grand total")
+    max_marks: float = Field(50, description="Maximum possible marks")
+    result: str = Field(..., description="PASS or FAIL")
+    examiner_comment: str = Field("", description="Short professional feedback")
+
+
+class HolisticResult(BaseModel):
+    """
+    Holistic evaluation result as returned by the LLM.
+    Requires sections A, B and C within their maximum marks.
+    """
+    section_wise_evaluation: Dict[str, SectionResult]
+    final_summary: HolisticSummary
+    
+    @model_validator(mode="after")
+    def check_sections(self) -> "HolisticResult":
+        sections = self.section_wise_evaluation
+        for section, max_marks in HOLISTIC_SECTION_MAX.items():
+            if section not in sections:
+                raise ValueError(f"section {section} is missing from section_wise_evaluation")
+            if sections[section].section_total > max_marks:
+                raise ValueError(
+                    f"section {section} total {sections[section].section_total} exceeds max {max_marks}"
+                )
+        return self
+
+
 # ============ API Response Schemas ============
 
 class JobStatus(BaseModel):
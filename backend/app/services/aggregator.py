@@ -13,9 +13,18 @@ Applies:
 - Section caps
 - Computes grand total, percentage, grade
 """
-import json
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from heapq import nlargest
+from math import fsum
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from .file_utils import write_atomic
 
 
 # Fixed section configuration for PT-II
@@ -25,37 +34,65 @@ SECTION_CONFIG = {
     "C": {"max_marks": 20, "retain_best": 2, "question_max": 10}
 }
 
+# Section order used throughout
+_SECTIONS: Tuple[str, ...] = tuple(SECTION_CONFIG)
+
+# Flattened per-section lookups, derived once from SECTION_CONFIG
+SECTION_MAX = {s: c["max_marks"] for s, c in SECTION_CONFIG.items()}
+SECTION_RETAIN = {s: c["retain_best"] for s, c in SECTION_CONFIG.items()}
+SECTION_QMAX = {s: c["question_max"] for s, c in SECTION_CONFIG.items()}
+
 TOTAL_MAX = 50
 PASS_MARKS = 25
 
+# Grade boundaries (lower bound, inclusive) and the label for each band
+_GRADE_CUTS = (45, 50, 55, 60, 70, 80, 90)
+_GRADE_LABELS = ("F", "D", "C", "B", "B+", "A", "A+", "O")  # O = Outstanding
+
+# Sentinel for a missing field, as opposed to a field set to 0
+_MISSING = object()
+
+# Shared read-only default for missing sections; never mutate
+_EMPTY: Dict[str, Any] = {}
+
+
+@dataclass(slots=True)
+class ScoredQuestion:
+    """A student's answer to one question, normalized once at ingest."""
+    total: float
+    max_marks: float
+    feedback: str = "No feedback"
+    subdivisions: Dict[str, Any] = field(default_factory=dict)
+
 
 def get_section_max_marks(section: str) -> int:
     """Get maximum evaluated marks for a section."""
-    return SECTION_CONFIG.get(section, {}).get("max_marks", 10)
+    return SECTION_MAX.get(section, 10)
 
 
-def calculate_question_total(question_data: Dict[str, Any]) -> float:
+def calculate_question_total(question_data: Dict[str, Any], _float=float) -> float:
     """Calculate total marks for a question from subdivisions or direct field."""
-    # Check for question_total first
-    if "question_total" in question_data:
-        return float(question_data["question_total"])
+    get = question_data.get
     
-    # Check for total_awarded
-    if "total_awarded" in question_data:
-        return float(question_data["total_awarded"])
-    
-    # Check for marks_awarded (backward compat)
-    if "marks_awarded" in question_data:
-        return float(question_data["marks_awarded"])
+    # question_total, then total_awarded, then marks_awarded (backward compat).
+    # A sentinel rather than truthiness, so a present 0 still wins.
+    value = get("question_total", _MISSING)
+    if value is _MISSING:
+        value = get("total_awarded", _MISSING)
+        if value is _MISSING:
+            value = get("marks_awarded", _MISSING)
+    if value is not _MISSING:
+        return _float(value)
     
     # Sum from subdivisions
-    subdivisions = question_data.get("subdivisions", {})
-    total = 0.0
-    for sub_id, sub_data in subdivisions.items():
-        if isinstance(sub_data, dict):
-            total += float(sub_data.get("marks_awarded", 0))
-    
-    return total
+    subdivisions = get("subdivisions")
+    if not subdivisions:
+        return 0.0
+    return fsum(
+        _float(sub_data.get("marks_awarded", 0))
+        for sub_data in subdivisions.values()
+        if isinstance(sub_data, dict)
+    )
 
 
 def get_question_max(question_data: Dict[str, Any], section: str) -> float:
@@ -69,48 +106,84 @@ def get_question_max(question_data: Dict[str, Any], section: str) -> float:
         return float(question_data["max_marks"])
     
     # Use section default
-    return float(SECTION_CONFIG.get(section, {}).get("question_max", 5))
+    return float(SECTION_QMAX.get(section, 5))
+
+
+def normalize_questions(section_result: Dict[str, Any], section: str) -> Dict[str, ScoredQuestion]:
+    """Normalize one section's raw question dicts, skipping malformed entries."""
+    return {
+        q_id: ScoredQuestion(
+            total=calculate_question_total(q_data),
+            max_marks=get_question_max(q_data, section),
+            feedback=q_data.get("feedback", "No feedback"),
+            subdivisions=q_data.get("subdivisions") or {}
+        )
+        for q_id, q_data in section_result.get("questions", _EMPTY).items()
+        if isinstance(q_data, dict)
+    }
+
+
+def normalize_section_results(
+    section_results: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, ScoredQuestion]]:
+    """
+    Normalize raw section results (as returned by the LLM) into ScoredQuestion
+    objects, so scoring code can rely on their structure.
+    """
+    return {
+        section: normalize_questions(section_result, section)
+        for section, section_result in section_results.items()
+    }
 
 
 def apply_answer_any_two_rule(
     section_result: Dict[str, Any],
     section: str
-) -> Tuple[List[str], List[str], float]:
+) -> Tuple[List[str], List[str], float, Dict[str, float]]:
     """
     Apply the answer-any-two rule for a section.
     
     Returns:
-        (retained_questions, discarded_questions, section_total)
+        (retained_questions, discarded_questions, section_total, scores_by_qid)
     """
-    questions = section_result.get("questions", {})
-    max_allowed = get_section_max_marks(section)
-    retain_count = SECTION_CONFIG.get(section, {}).get("retain_best", 2)
+    return _apply_answer_any_two_rule(normalize_questions(section_result, section), section)
+
+
+def _apply_answer_any_two_rule(
+    questions: Dict[str, ScoredQuestion],
+    section: str
+) -> Tuple[List[str], List[str], float, Dict[str, float]]:
+    """apply_answer_any_two_rule over already-normalized questions."""
+    max_allowed = SECTION_MAX.get(section, 10)
+    retain_count = SECTION_RETAIN.get(section, 2)
     
-    # Collect (question_id, marks_awarded) tuples
-    question_scores = []
-    for q_id, q_data in questions.items():
-        if isinstance(q_data, dict):
-            marks_awarded = calculate_question_total(q_data)
-            question_scores.append((q_id, marks_awarded))
+    # Marks awarded per question, kept for callers that report on them
+    scores_by_qid = {q_id: q.total for q_id, q in questions.items()}
+    question_scores = list(scores_by_qid.items())
     
-    # Sort by marks awarded (highest first)
-    question_scores.sort(key=lambda x: x[1], reverse=True)
+    # Pick the best N by marks awarded (highest first, ties keep input order)
+    top = nlargest(retain_count, question_scores, key=itemgetter(1))
+    retained = [qs[0] for qs in top]
+    section_total = sum(qs[1] for qs in top)
     
     if len(question_scores) <= retain_count:
         # Student answered fewer than required - keep all
-        retained = [qs[0] for qs in question_scores]
         discarded = []
-        section_total = sum(qs[1] for qs in question_scores)
     else:
-        # Student answered more - keep best N
-        retained = [qs[0] for qs in question_scores[:retain_count]]
-        discarded = [qs[0] for qs in question_scores[retain_count:]]
-        section_total = sum(qs[1] for qs in question_scores[:retain_count])
+        # Student answered more - drop the rest (highest score first)
+        retained_set = set(retained)
+        discarded = [
+            qs[0] for qs in sorted(
+                (qs for qs in question_scores if qs[0] not in retained_set),
+                key=itemgetter(1),
+                reverse=True
+            )
+        ]
     
     # Cap at max allowed for the section
     section_total = min(section_total, max_allowed)
     
-    return retained, discarded, section_total
+    return retained, discarded, section_total, scores_by_qid
 
 
 def compute_final_result(
@@ -144,8 +217,12 @@ def compute_final_result(
     }
     
     section_feedback = []
+    _sm = SECTION_MAX
+    normalized = normalize_section_results(section_results)
     
-    for section in ["A", "B", "C"]:
+    for section in _SECTIONS:
+        section_max = _sm.get(section, 10)
+        
         if section not in section_results:
             # Section not evaluated - add empty result
             final_result["sections"][section] = {
@@ -153,17 +230,16 @@ def compute_final_result(
                 "discarded_questions": [],
                 "questions": {},
                 "section_total": 0,
-                "section_max": get_section_max_marks(section)
+                "section_max": section_max
             }
             final_result["section_totals"][section] = 0
-            section_feedback.append(f"Section {section}: 0/{get_section_max_marks(section)} (not evaluated)")
+            section_feedback.append(f"Section {section}: 0/{section_max} (not evaluated)")
             continue
         
         sr = section_results[section]
-        section_max = get_section_max_marks(section)
         
         # Apply answer-any-two rule
-        retained, discarded, section_total = apply_answer_any_two_rule(sr, section)
+        retained, discarded, section_total, scores = _apply_answer_any_two_rule(normalized[section], section)
         
         # Get question details
         questions = sr.get("questions", {})
@@ -182,7 +258,7 @@ def compute_final_result(
         # Build section feedback
         if discarded:
             discarded_q = discarded[0]
-            discarded_marks = calculate_question_total(questions.get(discarded_q, {}))
+            discarded_marks = scores[discarded_q]
             section_feedback.append(
                 f"Section {section}: {section_total}/{section_max} "
                 f"(dropped {discarded_q} with {discarded_marks:.0f} marks)"
@@ -213,24 +289,81 @@ def compute_final_result(
     return final_result
 
 
+def compute_final_results_batch(
+    section_results_list: List[Dict[str, Dict[str, Any]]],
+    student_ids: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Score a batch of students at once with NumPy.
+    
+    Applies the same answer-any-two rule, section caps, percentage and grade
+    as compute_final_result, vectorized over a (students, sections,
+    questions) array. Returns only the scores - use compute_final_result
+    for retained/discarded questions and feedback.
+    
+    Args:
+        section_results_list: One section_results dict per student
+        student_ids: Student identifiers, in the same order
+    
+    Returns:
+        Per-student dicts with section_totals, grand_total, percentage,
+        grade and result
+    """
+    count = len(section_results_list)
+    if student_ids is None:
+        student_ids = ["UNKNOWN"] * count
+    
+    # Marks per student/section; short sections are padded with 0
+    marks = []
+    for sr in section_results_list:
+        normalized = normalize_section_results(sr)
+        marks.append([
+            [q.total for q in normalized.get(section, _EMPTY).values()]
+            for section in _SECTIONS
+        ])
+    retain = np.array([SECTION_RETAIN.get(s, 2) for s in _SECTIONS])
+    width = max([int(retain.max())] + [len(q) for student in marks for q in student])
+    scores = np.zeros((count, len(_SECTIONS), width))
+    for i, student in enumerate(marks):
+        for j, question_marks in enumerate(student):
+            scores[i, j, :len(question_marks)] = question_marks
+    
+    # Best N per section (highest first), capped at the section max
+    best_first = -np.sort(-scores, axis=-1)
+    keep = np.arange(width) < retain[:, None]
+    section_totals = np.minimum(
+        (best_first * keep).sum(axis=-1),
+        np.array([SECTION_MAX.get(s, 10) for s in _SECTIONS])
+    )
+    
+    grand_totals = section_totals.sum(axis=-1)
+    percentages = np.round(grand_totals / TOTAL_MAX * 100, 1)
+    grade_idx = np.searchsorted(_GRADE_CUTS, percentages, side="right")
+    
+    return [
+        {
+            "student_id": student_id,
+            "exam_mode": "PT-II",
+            "section_totals": dict(zip(_SECTIONS, totals)),
+            "grand_total": grand_total,
+            "max_possible": TOTAL_MAX,
+            "percentage": percentage,
+            "grade": _GRADE_LABELS[idx],
+            "result": "PASS" if grand_total >= PASS_MARKS else "FAIL"
+        }
+        for student_id, totals, grand_total, percentage, idx in zip(
+            student_ids,
+            section_totals.tolist(),
+            grand_totals.tolist(),
+            percentages.tolist(),
+            grade_idx.tolist()
+        )
+    ]
+
+
 def calculate_grade(percentage: float) -> str:
     """Calculate letter grade from percentage."""
-    if percentage >= 90:
-        return "O"  # Outstanding
-    elif percentage >= 80:
-        return "A+"
-    elif percentage >= 70:
-        return "A"
-    elif percentage >= 60:
-        return "B+"
-    elif percentage >= 55:
-        return "B"
-    elif percentage >= 50:
-        return "C"
-    elif percentage >= 45:
-        return "D"
-    else:
-        return "F"
+    return _GRADE_LABELS[bisect_right(_GRADE_CUTS, percentage)]
 
 
 def generate_overall_feedback(
@@ -240,50 +373,61 @@ def generate_overall_feedback(
     result: str
 ) -> str:
     """Generate human-readable overall feedback."""
-    feedback_parts = []
-    
-    # Result header
-    feedback_parts.append(f"Exam: Periodical Test - II")
-    feedback_parts.append(f"Result: {result}")
-    
     # Performance assessment
     if percentage >= 80:
-        feedback_parts.append("Excellent performance! Strong understanding of concepts.")
+        assessment = "Excellent performance! Strong understanding of concepts."
     elif percentage >= 60:
-        feedback_parts.append("Good performance with solid grasp of fundamentals.")
+        assessment = "Good performance with solid grasp of fundamentals."
     elif percentage >= 50:
-        feedback_parts.append("Average performance. Some concepts need more attention.")
+        assessment = "Average performance. Some concepts need more attention."
     elif percentage >= 40:
-        feedback_parts.append("Below average. Focus on understanding core concepts.")
+        assessment = "Below average. Focus on understanding core concepts."
     else:
-        feedback_parts.append("Needs significant improvement. Review all topics thoroughly.")
+        assessment = "Needs significant improvement. Review all topics thoroughly."
     
-    # Add section breakdown
-    feedback_parts.append("\nSection breakdown:")
-    feedback_parts.extend([f"  • {sf}" for sf in section_feedback])
-    
-    # Final summary
-    feedback_parts.append(f"\nFinal Score: {grand_total:.0f}/50 ({percentage}%)")
+    # Result header, assessment, section breakdown, final summary
+    feedback_parts = [
+        "Exam: Periodical Test - II",
+        f"Result: {result}",
+        assessment,
+        "\nSection breakdown:",
+        *[f"  • {sf}" for sf in section_feedback],
+        f"\nFinal Score: {grand_total:.0f}/50 ({percentage}%)"
+    ]
     
     return "\n".join(feedback_parts)
 
 
-def save_final_result(job_id: str, result: Dict[str, Any], outputs_dir: str) -> str:
-    """Save final result to JSON file."""
+def save_final_result(job_id: str, result: Dict[str, Any], outputs_dir: str, pretty: bool = True) -> str:
+    """
+    Save final result to JSON file.
+    Indented for people reading the file unless `pretty` is False.
+    """
     outputs_path = Path(outputs_dir)
     outputs_path.mkdir(parents=True, exist_ok=True)
     
     output_file = outputs_path / f"{job_id}_final_result.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
+    option = orjson.OPT_INDENT_2 if pretty else 0
+    write_atomic(output_file, orjson.dumps(result, option=option))
     
     return str(output_file)
 
 
-def generate_detailed_report(result: Dict[str, Any]) -> str:
+def _shorten_feedback(feedback: str, limit: int = 50) -> str:
+    """Truncate feedback to `limit` characters for the text report."""
+    return feedback if len(feedback) <= limit else feedback[:limit - 3] + "..."
+
+
+def generate_detailed_report(
+    result: Dict[str, Any],
+    question_scores: Optional[Dict[str, Dict[str, float]]] = None
+) -> str:
     """
     Generate a detailed text report from the evaluation result.
     Useful for printing or display.
+    
+    `question_scores` (section -> question id -> total, as returned by
+    apply_answer_any_two_rule) skips recomputing each question's total.
     """
     lines = [
         "=" * 60,
@@ -298,58 +442,69 @@ def generate_detailed_report(result: Dict[str, Any]) -> str:
         ""
     ]
     
-    for section in ["A", "B", "C"]:
-        if section not in result.get("sections", {}):
+    sections = result.get("sections", {})
+    for section in _SECTIONS:
+        if section not in sections:
             continue
         
-        section_data = result["sections"][section]
-        lines.append(f"SECTION {section}:")
-        lines.append(f"  Total: {section_data.get('section_total', 0):.0f}/{section_data.get('section_max', 0)}")
-        lines.append(f"  Retained: {', '.join(section_data.get('retained_questions', []))}")
-        
-        if section_data.get('discarded_questions'):
-            lines.append(f"  Discarded: {', '.join(section_data['discarded_questions'])} (lowest score)")
-        
+        section_data = sections[section]
+        retained = section_data.get('retained_questions', [])
+        discarded = section_data.get('discarded_questions')
+        lines.extend((
+            f"SECTION {section}:",
+            f"  Total: {section_data.get('section_total', 0):.0f}/{section_data.get('section_max', 0)}",
+            f"  Retained: {', '.join(retained)}"
+        ))
+        if discarded:
+            lines.append(f"  Discarded: {', '.join(discarded)} (lowest score)")
         lines.append("")
         
         # Question details
-        for q_id, q_data in section_data.get("questions", {}).items():
-            if isinstance(q_data, dict):
-                status = "✓" if q_id in section_data.get('retained_questions', []) else "✗"
-                total_awarded = calculate_question_total(q_data)
-                max_marks = get_question_max(q_data, section)
-                feedback = q_data.get('feedback', 'No feedback')
-                if len(feedback) > 50:
-                    feedback = feedback[:47] + "..."
-                lines.append(
-                    f"    {status} {q_id}: {total_awarded:.0f}/{max_marks:.0f} - {feedback}"
-                )
-        
+        retained_set = set(retained)
+        scores = (question_scores or _EMPTY).get(section, _EMPTY)
+        lines.extend([
+            f"    {'✓' if q_id in retained_set else '✗'} {q_id}: "
+            f"{scores[q_id] if q_id in scores else calculate_question_total(q_data):.0f}/"
+            f"{get_question_max(q_data, section):.0f} - "
+            f"{_shorten_feedback(q_data.get('feedback', 'No feedback'))}"
+            for q_id, q_data in section_data.get("questions", {}).items()
+            if isinstance(q_data, dict)
+        ])
         lines.append("")
     
-    lines.append("-" * 60)
-    lines.append(result.get("overall_feedback", ""))
-    lines.append("=" * 60)
+    lines.extend((
+        "-" * 60,
+        result.get("overall_feedback", ""),
+        "=" * 60
+    ))
     
     return "\n".join(lines)
 
 
+def _section_score(sections: Dict[str, Any], totals: Dict[str, Any], section: str) -> Dict[str, Any]:
+    """Build one `section_scores` entry for create_output_json."""
+    return {
+        "retained": sections.get(section, _EMPTY).get("retained_questions", ()),
+        "score": totals.get(section, 0)
+    }
+
+
 def create_output_json(result: Dict[str, Any]) -> Dict[str, Any]:
     """
     Create the final output JSON in the specified format.
     """
+    sections = result["sections"]
+    totals = result["section_totals"]
     return {
         "student_id": result.get("student_id", "UNKNOWN"),
         "exam": "PT-II",
         "section_scores": {
-            section: {
-                "retained": result["sections"].get(section, {}).get("retained_questions", []),
-                "score": result["section_totals"].get(section, 0)
-            }
-            for section in ["A", "B", "C"]
+            "A": _section_score(sections, totals, "A"),
+            "B": _section_score(sections, totals, "B"),
+            "C": _section_score(sections, totals, "C")
         },
         "grand_total": result.get("grand_total", 0),
         "percentage": result.get("percentage", 0),
         "result": result.get("result", "FAIL"),
-        "audit_log": result.get("audit_log", [])
+        "audit_log": result.get("audit_log", ())
     }
@@ -2,11 +2,36 @@
 Checkpoint service for saving and loading evaluation progress.
 Enables resume from last successful stage after rate limits or failures.
 """
-import json
+import os
+import pickle
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
+import orjson
+
+from .file_utils import write_atomic
+
+
+@lru_cache(maxsize=None)
+def _checkpoint_dir(checkpoint_dir: str) -> Path:
+    """Resolve and create a checkpoint directory once per process."""
+    path = Path(checkpoint_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+@lru_cache(maxsize=8)
+def _load_ocr_texts(ocr_path: str, mtime_ns: int) -> Dict[str, str]:
+    """
+    Parse an OCR sidecar. Keyed on mtime_ns so a rewrite invalidates it;
+    resumes and repeated getters share one parse of the large texts.
+    """
+    with open(ocr_path, "rb") as f:
+        return orjson.loads(f.read())
+
 
 class CheckpointService:
     """Manages checkpoint persistence for staged evaluation."""
@@ -16,25 +41,136 @@ class CheckpointService:
         "EVALUATION_COMPLETE",
         "AGGREGATION_COMPLETE"
     ]
+    STAGE_INDEX = {stage: i for i, stage in enumerate(STAGES)}
+    SECTIONS = ("A", "B", "C")
+    
+    # Saves are fsynced in batches: every FLUSH_EVERY saves, once
+    # FLUSH_INTERVAL_SECONDS have passed, or on an explicit flush()
+    FLUSH_EVERY = 3
+    FLUSH_INTERVAL_SECONDS = 30.0
     
-    def __init__(self, job_id: str, checkpoint_dir: str = "./checkpoints"):
+    def __init__(self, job_id: str, checkpoint_dir: str = "./checkpoints", fast_io: bool = False):
         self.job_id = job_id
-        self.checkpoint_dir = Path(checkpoint_dir)
-        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        # Services are built per request/job; directory setup is shared
+        self.checkpoint_dir = _checkpoint_dir(checkpoint_dir)
         self.checkpoint_file = self.checkpoint_dir / f"{job_id}_checkpoint.json"
+        self.summary_file = self.checkpoint_dir / f"{job_id}_summary.json"
+        # OCR text is large and written once, so it lives in its own file
+        self.ocr_file = self.checkpoint_dir / f"{job_id}_ocr.json"
+        # Plain str paths for the per-save file operations
+        self._checkpoint_path = str(self.checkpoint_file)
+        self._summary_path = str(self.summary_file)
+        self._ocr_path = str(self.ocr_file)
+        # With fast_io, a pickle copy is written next to the JSON and read
+        # first while it is at least as new; the JSON stays authoritative
+        self.fast_io = fast_io
+        self._pickle_path = self._checkpoint_path + ".pkl"
+        self._cached: Optional[Dict[str, Any]] = None
+        self._cached_mtime: Optional[int] = None
+        self._unflushed_saves = 0
+        self._last_flush = time.monotonic()
     
     def load(self) -> Optional[Dict[str, Any]]:
-        """Load existing checkpoint if it exists."""
-        if self.checkpoint_file.exists():
-            with open(self.checkpoint_file, "r") as f:
-                return json.load(f)
-        return None
+        """
+        Load existing checkpoint if it exists.
+        The parsed checkpoint is kept on the instance and reused until the
+        file's mtime changes, so repeated getters cost one stat each.
+        """
+        try:
+            mtime_ns = os.stat(self._checkpoint_path).st_mtime_ns
+        except FileNotFoundError:
+            self._cached = None
+            self._cached_mtime = None
+            return None
+        
+        if self._cached is None or mtime_ns != self._cached_mtime:
+            self._cached = self._load_pickle(mtime_ns) if self.fast_io else None
+            if self._cached is None:
+                with open(self._checkpoint_path, "rb") as f:
+                    self._cached = orjson.loads(f.read())
+            self._cached_mtime = mtime_ns
+        return self._cached
+    
+    def _load_pickle(self, json_mtime_ns: int) -> Optional[Dict[str, Any]]:
+        """Read the pickle copy if it is not older than the JSON checkpoint."""
+        try:
+            if os.stat(self._pickle_path).st_mtime_ns < json_mtime_ns:
+                return None
+            with open(self._pickle_path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+    
+    def load_summary(self) -> Optional[Dict[str, Any]]:
+        """
+        Load the small progress summary written alongside the checkpoint.
+        Falls back to summarizing the full checkpoint when no summary exists.
+        """
+        if os.path.exists(self._summary_path):
+            with open(self._summary_path, "rb") as f:
+                return orjson.loads(f.read())
+        checkpoint = self.load()
+        if checkpoint is None:
+            return None
+        return self.summarize(checkpoint)
+    
+    @staticmethod
+    def summarize(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the progress summary of a checkpoint (no OCR text or results)."""
+        section_results = data.get("section_results", {})
+        
+        # Mode from the final result, else from the first section that reports one
+        exam_mode = data.get("final_result", {}).get("exam_mode")
+        if exam_mode is None:
+            for section_data in section_results.values():
+                if "mode" in section_data:
+                    exam_mode = section_data["mode"]
+                    break
+        
+        return {
+            "job_id": data.get("job_id"),
+            "stage": data.get("stage"),
+            "exam_mode": exam_mode,
+            "completed_sections": data.get("completed_sections", []),
+            "has_ocr_texts": bool(data.get("ocr_texts_file") or data.get("ocr_texts")),
+            "has_structure": bool(data.get("structure")),
+            "section_results_available": list(section_results.keys()),
+            "created_at": data.get("created_at"),
+            "updated_at": data.get("updated_at")
+        }
     
-    def save(self, data: Dict[str, Any]):
-        """Save checkpoint to disk."""
+    def save(self, data: Dict[str, Any], flush: bool = False):
+        """
+        Save checkpoint and its progress summary to disk.
+        
+        Files are replaced atomically; fsync is deferred to flush(), which runs
+        when `flush` is set or the batch size/interval is reached.
+        """
         data["updated_at"] = datetime.utcnow().isoformat()
-        with open(self.checkpoint_file, "w") as f:
-            json.dump(data, f, indent=2)
+        write_atomic(self._checkpoint_path, orjson.dumps(data))
+        self._cached = data
+        self._cached_mtime = os.stat(self._checkpoint_path).st_mtime_ns
+        write_atomic(self._summary_path, orjson.dumps(self.summarize(data)))
+        if self.fast_io:
+            write_atomic(self._pickle_path, pickle.dumps(data, protocol=5))
+        
+        self._unflushed_saves += 1
+        if (
+            flush
+            or self._unflushed_saves >= self.FLUSH_EVERY
+            or time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL_SECONDS
+        ):
+            self.flush()
+    
+    def flush(self):
+        """Force checkpoint writes made since the last flush to stable storage."""
+        if self._unflushed_saves:
+            for path in (self._checkpoint_path, self._summary_path):
+                if os.path.exists(path):
+                    with open(path, "rb+") as f:
+                        os.fsync(f.fileno())
+        self._unflushed_saves = 0
+        self._last_flush = time.monotonic()
     
     def init_checkpoint(self) -> Dict[str, Any]:
         """Initialize a new checkpoint."""
@@ -53,20 +189,27 @@ class CheckpointService:
     
     def get_or_create(self) -> Dict[str, Any]:
         """Get existing checkpoint or create new one."""
-        checkpoint = self.load()
+        checkpoint = self._cached if self._cached is not None else self.load()
         if checkpoint is None:
             checkpoint = self.init_checkpoint()
         return checkpoint
     
     def save_ocr_complete(self, question_text: str, answer_key_text: str, student_text: str):
-        """Save OCR results."""
-        checkpoint = self.get_or_create()
-        checkpoint["stage"] = "OCR_COMPLETE"
-        checkpoint["ocr_texts"] = {
+        """
+        Save OCR results.
+        The texts go to a sidecar file written once; the checkpoint only
+        references it, so later saves don't rewrite them.
+        """
+        write_atomic(self._ocr_path, orjson.dumps({
             "question_paper": question_text,
             "answer_key": answer_key_text,
             "student_answers": student_text
-        }
+        }))
+        
+        checkpoint = self.get_or_create()
+        checkpoint["stage"] = "OCR_COMPLETE"
+        checkpoint["ocr_texts"] = {}
+        checkpoint["ocr_texts_file"] = self.ocr_file.name
         self.save(checkpoint)
     
     def save_structure(self, structure: Dict[str, Any]):
@@ -80,7 +223,9 @@ class CheckpointService:
         """Save evaluation result for a section."""
         checkpoint = self.get_or_create()
         checkpoint["section_results"][section] = result
-        checkpoint["completed_sections"].append(section)
+        # A section re-evaluated on resume is only listed once
+        if section not in checkpoint["completed_sections"]:
+            checkpoint["completed_sections"].append(section)
         checkpoint["stage"] = f"SECTION_{section}_EVALUATED"
         self.save(checkpoint)
     
@@ -89,16 +234,15 @@ class CheckpointService:
         checkpoint = self.get_or_create()
         checkpoint["stage"] = "AGGREGATION_COMPLETE"
         checkpoint["final_result"] = final_result
-        self.save(checkpoint)
+        self.save(checkpoint, flush=True)
     
     def is_ocr_complete(self) -> bool:
         """Check if OCR stage is complete."""
         checkpoint = self.load()
         if checkpoint is None:
             return False
-        stage_idx = self.STAGES.index("OCR_COMPLETE") if "OCR_COMPLETE" in self.STAGES else -1
-        current_idx = self.STAGES.index(checkpoint.get("stage", "")) if checkpoint.get("stage") in self.STAGES else -1
-        return current_idx >= stage_idx
+        current_idx = self.STAGE_INDEX.get(checkpoint.get("stage"), -1)
+        return current_idx >= self.STAGE_INDEX["OCR_COMPLETE"]
     
     def is_section_complete(self, section: str) -> bool:
         """Check if a section has been evaluated."""
@@ -110,12 +254,22 @@ class CheckpointService:
     def get_pending_sections(self) -> List[str]:
         """Get list of sections not yet evaluated."""
         checkpoint = self.load()
-        completed = checkpoint.get("completed_sections", []) if checkpoint else []
-        return [s for s in ["A", "B", "C"] if s not in completed]
+        completed = set(checkpoint.get("completed_sections", [])) if checkpoint else set()
+        return [s for s in self.SECTIONS if s not in completed]
     
     def get_ocr_texts(self) -> Optional[Dict[str, str]]:
-        """Get saved OCR texts."""
+        """
+        Get saved OCR texts (from the sidecar, or inline in older checkpoints).
+        The returned dict is shared between callers; treat it as read-only.
+        """
         checkpoint = self.load()
+        if checkpoint and checkpoint.get("ocr_texts_file"):
+            ocr_path = str(self.checkpoint_dir / checkpoint["ocr_texts_file"])
+            try:
+                mtime_ns = os.stat(ocr_path).st_mtime_ns
+            except FileNotFoundError:
+                return None
+            return _load_ocr_texts(ocr_path, mtime_ns)
         if checkpoint and "ocr_texts" in checkpoint:
             return checkpoint["ocr_texts"]
         return None
@@ -127,6 +281,13 @@ class CheckpointService:
             return checkpoint["structure"]
         return None
     
+    def get_final_result(self) -> Optional[Dict[str, Any]]:
+        """Get saved final result, if evaluation already finished."""
+        checkpoint = self.load()
+        if checkpoint:
+            return checkpoint.get("final_result")
+        return None
+    
     def get_section_results(self) -> Dict[str, Any]:
         """Get all completed section results."""
         checkpoint = self.load()
@@ -135,6 +296,7 @@ class CheckpointService:
         return {}
     
     def cleanup(self):
-        """Remove checkpoint file after successful completion."""
-        if self.checkpoint_file.exists():
-            self.checkpoint_file.unlink()
+        """Remove checkpoint files after successful completion."""
+        for path in (self._checkpoint_path, self._summary_path, self._ocr_path, self._pickle_path):
+            if os.path.exists(path):
+                os.unlink(path)
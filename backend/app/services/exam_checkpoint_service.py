@@ -9,32 +9,99 @@ Key Features:
 - Stores QP and AK OCR text permanently
 - Used by llm_evaluator to skip redundant OCR
 """
+import os
 import json
 import hashlib
-from pathlib import Path
+from functools import lru_cache
 from typing import Dict, Optional
 from datetime import datetime
 
+import orjson
 
-def compute_file_hash(file_path: str) -> str:
-    """Compute SHA256 hash of a file's contents."""
-    sha256 = hashlib.sha256()
+from .checkpoint_service import _checkpoint_dir
+from .file_utils import write_atomic
+
+
+# Chunk size for hashing large PDFs
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def _update_from_file(digest, f):
+    """Feed an open binary file into `digest` in chunks, reusing one buffer."""
+    buf = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buf)
+    while n := f.readinto(buf):
+        digest.update(view[:n])
+
+
+@lru_cache(maxsize=256)
+def _hash_cached(file_path: str, mtime_ns: int, size: int) -> str:
+    """
+    Hash a file's contents. mtime_ns and size are part of the cache key, so a
+    changed file is re-hashed while the same QP/AK across a batch is not.
+    """
     with open(file_path, "rb") as f:
-        # Read in chunks for large files
-        for chunk in iter(lambda: f.read(8192), b""):
-            sha256.update(chunk)
+        if hasattr(hashlib, "file_digest"):
+            # Python 3.11+: hashed in C straight from the file
+            sha256 = hashlib.file_digest(f, "sha256")
+        else:
+            # Read in chunks for large files
+            sha256 = hashlib.sha256()
+            _update_from_file(sha256, f)
     return sha256.hexdigest()[:16]  # First 16 chars for shorter ID
 
 
+def compute_file_hash(file_path: str) -> str:
+    """Compute SHA256 hash of a file's contents (memoized per path/mtime/size)."""
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    return _hash_cached(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=256)
+def _exam_id_cached(
+    qp_path: str, qp_mtime_ns: int, qp_size: int,
+    ak_path: str, ak_mtime_ns: int, ak_size: int
+) -> str:
+    """
+    Hash QP then AK into one SHA256. Each file is prefixed with its size, so
+    (QP, AK) cannot collide with a different split of the same bytes (a
+    separator byte would not do: PDFs contain every byte value).
+    """
+    sha256 = hashlib.sha256()
+    for path, size in ((qp_path, qp_size), (ak_path, ak_size)):
+        sha256.update(size.to_bytes(8, "big"))
+        with open(path, "rb") as f:
+            _update_from_file(sha256, f)
+    return f"exam_{sha256.hexdigest()[:16]}"
+
+
+@lru_cache(maxsize=8)
+def _load_exam(exam_id: str, checkpoint_path: str, mtime_ns: int) -> Optional[Dict]:
+    """
+    Parse an exam checkpoint. Keyed on mtime_ns so a save invalidates it;
+    every student in a batch shares one parse of the (large) QP/AK texts.
+    """
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return None
+
+
 def generate_exam_id(question_pdf_path: str, answer_key_pdf_path: str) -> str:
     """
-    Generate a unique exam_id from QP and AK file hashes.
+    Generate a unique exam_id from the QP and AK file contents.
     Same QP + AK always produces the same exam_id.
     """
-    qp_hash = compute_file_hash(question_pdf_path)
-    ak_hash = compute_file_hash(answer_key_pdf_path)
-    combined = f"{qp_hash}_{ak_hash}"
-    return f"exam_{combined}"
+    qp_path = os.path.abspath(question_pdf_path)
+    ak_path = os.path.abspath(answer_key_pdf_path)
+    qp_stat = os.stat(qp_path)
+    ak_stat = os.stat(ak_path)
+    return _exam_id_cached(
+        qp_path, qp_stat.st_mtime_ns, qp_stat.st_size,
+        ak_path, ak_stat.st_mtime_ns, ak_stat.st_size
+    )
 
 
 class ExamCheckpointService:
@@ -47,13 +114,13 @@ class ExamCheckpointService:
     
     def __init__(self, exam_id: str, checkpoint_dir: str = "./checkpoints"):
         self.exam_id = exam_id
-        self.checkpoint_dir = Path(checkpoint_dir)
-        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_dir = _checkpoint_dir(checkpoint_dir)
         self.checkpoint_file = self.checkpoint_dir / f"{exam_id}_exam.json"
+        self._checkpoint_path = str(self.checkpoint_file)
     
     def exists(self) -> bool:
         """Check if exam checkpoint exists."""
-        return self.checkpoint_file.exists()
+        return os.path.exists(self._checkpoint_path)
     
     def has_complete_ocr(self) -> bool:
         """Check if QP and AK OCR are both complete."""
@@ -68,28 +135,35 @@ class ExamCheckpointService:
         )
     
     def load(self) -> Optional[Dict]:
-        """Load existing exam checkpoint."""
-        if self.exists():
-            try:
-                with open(self.checkpoint_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                return None
-        return None
+        """
+        Load existing exam checkpoint.
+        The parsed dict is cached and shared between instances, so treat it
+        as read-only and copy it before making changes.
+        """
+        try:
+            mtime_ns = os.stat(self._checkpoint_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        return _load_exam(self.exam_id, self._checkpoint_path, mtime_ns)
+    
+    @classmethod
+    def clear_cache(cls):
+        """Drop all cached exam checkpoints."""
+        _load_exam.cache_clear()
     
     def save(self, data: Dict):
         """Save exam checkpoint to disk."""
         data["exam_id"] = self.exam_id
         data["updated_at"] = datetime.utcnow().isoformat()
-        with open(self.checkpoint_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        # Compact C-encoded JSON; the OCR texts make this file large
+        write_atomic(self._checkpoint_path, orjson.dumps(data))
     
     def save_ocr_results(self, question_text: str, answer_key_text: str):
         """
         Save QP and AK OCR results.
         This is called ONCE after first successful extraction.
         """
-        data = self.load() or {}
+        data = dict(self.load() or {})
         data["question_paper_text"] = question_text
         data["answer_key_text"] = answer_key_text
         data["ocr_completed_at"] = datetime.utcnow().isoformat()
@@ -0,0 +1,33 @@
+"""
+File helpers shared by the services.
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Union
+
+
+def write_atomic(path: Union[str, Path], payload: bytes):
+    """
+    Write `payload` to `path` so readers never see a partial file.
+    
+    The bytes go to a uniquely named temp file in the same directory, which
+    is then swapped in with os.replace, so concurrent writers of the same
+    path (e.g. jobs in worker threads) never clobber each other's temp file.
+    """
+    path = os.fspath(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".",
+        prefix=os.path.basename(path) + ".",
+        suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
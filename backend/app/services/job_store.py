@@ -2,54 +2,114 @@
 In-memory job store for tracking evaluation jobs.
 """
 import threading
-from typing import Dict, Optional, Any
-from datetime import datetime
+import time
+from types import MappingProxyType
+from typing import Dict, Optional, Any, Iterable, List, Mapping
+from datetime import datetime, timedelta
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _ns_to_iso(ns: Optional[int]) -> Optional[str]:
+    """Format a `time.time_ns()` timestamp as a naive UTC ISO-8601 string."""
+    if ns is None:
+        return None
+    return (_EPOCH + timedelta(microseconds=ns // 1000)).isoformat()
 
 
 class JobStore:
-    """Thread-safe in-memory job store."""
+    """
+    Thread-safe in-memory job store.
+    
+    Job entries are never mutated in place: writers build a new dict under the
+    lock and swap it in with a single assignment, so readers can take a
+    read-only view of the current entry without locking or copying.
+    
+    Timestamps are kept as `time.time_ns()` integers (`created_at_ns`,
+    `updated_at_ns`); use `to_dict()` to get the ISO strings.
+    """
     
     def __init__(self):
         self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
         self._lock = threading.Lock()
     
-    def create_job(self, job_id: str) -> Dict[str, Any]:
+    def create_job(self, job_id: str) -> Mapping[str, Any]:
         """Create a new job entry."""
+        now = time.time_ns()
+        job = {
+            "job_id": job_id,
+            "status": "processing",
+            "created_at_ns": now,
+            "updated_at_ns": now,
+            "error": None,
+            "result": None
+        }
         with self._lock:
-            self._jobs[job_id] = {
-                "job_id": job_id,
-                "status": "processing",
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat(),
-                "error": None,
-                "result": None
-            }
-            return self._jobs[job_id].copy()
+            self._jobs[job_id] = job
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+        return MappingProxyType(job)
     
     def update_job(self, job_id: str, status: str, error: Optional[str] = None, result: Optional[Dict] = None):
         """Update job status."""
         with self._lock:
-            if job_id in self._jobs:
-                self._jobs[job_id]["status"] = status
-                self._jobs[job_id]["updated_at"] = datetime.utcnow().isoformat()
-                if error:
-                    self._jobs[job_id]["error"] = error
-                if result:
-                    self._jobs[job_id]["result"] = result
-    
-    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
-        """Get job by ID."""
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            updated = dict(job)
+            updated["status"] = status
+            updated["updated_at_ns"] = time.time_ns()
+            if error:
+                updated["error"] = error
+            if result:
+                updated["result"] = result
+            self._jobs[job_id] = updated
+            self._versions[job_id] += 1
+    
+    def transition(self, job_id: str, from_statuses: Iterable[str], to_status: str) -> Optional[Mapping[str, Any]]:
+        """
+        Atomically move a job to `to_status` if its current status is one of
+        `from_statuses`. Returns the job as it was before the change, or None
+        if the job does not exist or is in another status.
+        """
         with self._lock:
-            if job_id in self._jobs:
-                return self._jobs[job_id].copy()
-            return None
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] not in from_statuses:
+                return None
+            updated = dict(job)
+            updated["status"] = to_status
+            updated["updated_at_ns"] = time.time_ns()
+            self._jobs[job_id] = updated
+            self._versions[job_id] += 1
+        return MappingProxyType(job)
+    
+    def get_job(self, job_id: str) -> Optional[Mapping[str, Any]]:
+        """Get a read-only view of the job by ID."""
+        job = self._jobs.get(job_id)
+        return MappingProxyType(job) if job is not None else None
+    
+    @staticmethod
+    def to_dict(job: Mapping[str, Any]) -> Dict[str, Any]:
+        """Convert a job entry into a plain dict with ISO `created_at`/`updated_at`."""
+        data = dict(job)
+        data["created_at"] = _ns_to_iso(data.pop("created_at_ns", None))
+        data["updated_at"] = _ns_to_iso(data.pop("updated_at_ns", None))
+        return data
+    
+    def list_ids_with_prefix(self, prefix: str) -> List[str]:
+        """Get IDs of all jobs whose ID starts with `prefix`."""
+        with self._lock:
+            return [job_id for job_id in self._jobs if job_id.startswith(prefix)]
+    
+    def get_version(self, job_id: str) -> int:
+        """Get a counter that changes every time the job is created or updated."""
+        return self._versions.get(job_id, 0)
     
     def get_result(self, job_id: str) -> Optional[Dict]:
         """Get evaluation result for a job."""
-        with self._lock:
-            if job_id in self._jobs:
-                return self._jobs[job_id].get("result")
-            return None
+        job = self._jobs.get(job_id)
+        return job.get("result") if job is not None else None
 
 
 # Global job store instance
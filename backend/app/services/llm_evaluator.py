@@ -18,24 +18,78 @@ Key features:
 """
 import os
 import json
+import hashlib
 import asyncio
 import httpx
+import orjson
 import yaml
 import re
+import weakref
+from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
-from .ocr_service import pdf_to_base64_images, get_extraction_prompt
+from .ocr_service import pdf_to_base64_images, get_extraction_prompt, image_mime_type
 from .checkpoint_service import CheckpointService
 from .exam_checkpoint_service import ExamCheckpointService, generate_exam_id
 from .job_store import job_store
+from .file_utils import write_atomic
+from ..schemas.output_schema import HolisticResult
 
+try:
+    import tiktoken
+except ImportError:  # Token budgets fall back to the 1 token ≈ 3 chars estimate
+    tiktoken = None
 
+
+# libyaml's C loader when available, else the pure-Python one
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Characters that matter when scanning for JSON objects in free text
+_JSON_TOKEN_RE = re.compile(r'[{}"\\]')
+
+# Fresh brace scans made when looking for JSON objects in free text
+_MAX_JSON_SCANS = 100
+
+# Fenced code blocks, tagged as JSON first, then any language
+_CODEBLOCK_JSON_RE = re.compile(r'```json\s*([\s\S]*?)\s*```')
+_CODEBLOCK_ANY_RE = re.compile(r'```\s*([\s\S]*?)\s*```')
+
+# Whitespace in OCR text that costs tokens: runs of spaces/tabs inside a line
+# (leading indentation is kept, answers may contain code), trailing spaces,
+# and runs of blank lines
+_INLINE_SPACE_RE = re.compile(r'(?<=\S)[ \t]{2,}|(?<=\S)\t')
+_TRAILING_SPACE_RE = re.compile(r'[ \t]+$', re.MULTILINE)
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+# Completion tokens reserved for the holistic evaluation output
+_HOLISTIC_OUTPUT_TOKENS = 8000
+
+# A validation retry echoes at most this much of the invalid output and
+# error back to the model; its tokens are reserved in the document budget
+_RETRY_ECHO_CHARS = 6000
+_RETRY_ERROR_CHARS = 1000
+_RETRY_FEEDBACK_TOKENS = (_RETRY_ECHO_CHARS + _RETRY_ERROR_CHARS) // 3 + 100
+
+# Semaphores and API clients are bound to the event loop that first uses
+# them, so each loop (the server's, or asyncio.run() in scripts and tests)
+# gets its own, created lazily; see _loop_state()
+_LOOP_STATE: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Any, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_HTTP_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_connections=200, keepalive_expiry=60)
+
+
+@lru_cache(maxsize=1)
 def load_config() -> Dict[str, Any]:
-    """Load configuration from YAML file."""
+    """
+    Load configuration from YAML file.
+    Parsed once per process; the returned dict is shared, so treat it as read-only.
+    """
     config_path = Path(__file__).parent.parent / "config" / "config.yaml"
     with open(config_path, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=_YAML_LOADER)
     
     # Resolve environment variables for all LLM configs
     def resolve_api_key(llm_config: Dict[str, Any]) -> None:
@@ -59,6 +113,130 @@ def load_config() -> Dict[str, Any]:
     return config
 
 
+@lru_cache(maxsize=1)
+def get_checkpoints_dir() -> str:
+    """Resolve the checkpoints directory from config once per process."""
+    return load_config().get("paths", {}).get("checkpoints", "./checkpoints")
+
+
+def reload_config() -> Dict[str, Any]:
+    """
+    Drop the cached config and values derived from it, then load it again.
+    For tests and tooling; a running app keeps the copy on app.state.config.
+    """
+    get_checkpoints_dir.cache_clear()
+    load_config.cache_clear()
+    return load_config()
+
+
+def _json_loads(text: str) -> Any:
+    """
+    Parse JSON with orjson, falling back to the stdlib for the few inputs
+    orjson rejects (NaN/Infinity, very deep nesting). Raises json.JSONDecodeError.
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text)
+
+
+def _scan_braces(text: str, start: int, ends: Dict[int, int]):
+    """
+    Scan from the { at `start` until it closes (or the text ends), ignoring
+    braces inside quoted strings. Every { met outside a string is recorded
+    in `ends` with the index of its closing } (-1 if it never closes): a
+    fresh scan from that { would see the same string state and find the
+    same match, so it never needs scanning again.
+    """
+    stack = []
+    in_string = False
+    skip_at = -1
+    for match in _JSON_TOKEN_RE.finditer(text, start):
+        i = match.start()
+        c = text[i]
+        if in_string:
+            if i == skip_at:
+                continue  # Escaped character
+            if c == '\\':
+                skip_at = i + 1
+            elif c == '"':
+                in_string = False
+        elif c == '{':
+            stack.append(i)
+        elif c == '}':
+            ends[stack.pop()] = i
+            if not stack:
+                return
+        elif c == '"':
+            in_string = True
+    for open_at in stack:
+        ends[open_at] = -1
+
+
+def _iter_json_spans(text: str) -> Iterator[str]:
+    """
+    Yield candidate JSON objects in `text`, ordered by start position.
+    
+    A { is scanned with fresh string state unless an earlier scan already
+    resolved it, so an unbalanced brace or quote in the surrounding prose
+    (e.g. quoted code) only costs that one candidate, while runs of
+    unclosed braces are resolved by a single scan. Nested objects are
+    candidates too, for when an outer brace pair is just prose. At most
+    _MAX_JSON_SCANS fresh scans are made, bounding the work on
+    pathological text.
+    """
+    ends: Dict[int, int] = {}
+    scans = 0
+    start = text.find('{')
+    while start != -1:
+        end = ends.pop(start, None)
+        if end is None:
+            if scans >= _MAX_JSON_SCANS:
+                return
+            scans += 1
+            _scan_braces(text, start, ends)
+            end = ends.pop(start)
+        if end != -1:
+            yield text[start:end + 1]
+        start = text.find('{', start + 1)
+
+
+def _strip_trailing_commas(s: str) -> str:
+    """Drop commas that are followed (after whitespace) by } or ]."""
+    parts = []
+    start = 0
+    n = len(s)
+    i = s.find(',')
+    while i != -1:
+        j = i + 1
+        while j < n and s[j] in ' \t\r\n':
+            j += 1
+        if j < n and (s[j] == '}' or s[j] == ']'):
+            parts.append(s[start:i])
+            start = i + 1
+        i = s.find(',', j)
+    if not parts:
+        return s
+    parts.append(s[start:])
+    return ''.join(parts)
+
+
+def _loads_with_repair(candidate: str) -> Optional[Any]:
+    """Parse a JSON candidate, retrying once without trailing commas."""
+    try:
+        return _json_loads(candidate)
+    except json.JSONDecodeError:
+        pass
+    # Remove trailing commas before closing braces/brackets
+    cleaned = _strip_trailing_commas(candidate)
+    if cleaned is candidate:
+        return None
+    try:
+        return _json_loads(cleaned)
+    except json.JSONDecodeError:
+        return None
+
+
 def extract_json_from_response(text: str) -> Dict[str, Any]:
     """
     Extract JSON from LLM response.
@@ -66,74 +244,33 @@ def extract_json_from_response(text: str) -> Dict[str, Any]:
     """
     # First, try direct parsing
     try:
-        return json.loads(text)
+        return _json_loads(text)
     except json.JSONDecodeError:
         pass
     
     # Try to find JSON in code blocks
-    patterns = [
-        r'```json\s*([\s\S]*?)\s*```',
-        r'```\s*([\s\S]*?)\s*```',
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text)
-        for match in matches:
+    for pattern in (_CODEBLOCK_JSON_RE, _CODEBLOCK_ANY_RE):
+        for match in pattern.findall(text):
             try:
                 cleaned = match.strip()
                 if cleaned.startswith('{'):
-                    return json.loads(cleaned)
+                    return _json_loads(cleaned)
             except json.JSONDecodeError:
                 continue
     
-    # Try to find a JSON object by looking for { and matching }
-    # Find all { positions and try to parse from each one
-    brace_positions = [i for i, c in enumerate(text) if c == '{']
-    
-    for start in brace_positions:
-        # Find matching closing brace by counting braces
-        depth = 0
-        end = start
-        for i in range(start, len(text)):
-            if text[i] == '{':
-                depth += 1
-            elif text[i] == '}':
-                depth -= 1
-                if depth == 0:
-                    end = i
-                    break
-        
-        if end > start:
-            potential_json = text[start:end+1]
-            try:
-                return json.loads(potential_json)
-            except json.JSONDecodeError:
-                # Try cleaning common issues
-                cleaned = potential_json
-                # Remove trailing commas before closing braces/brackets
-                cleaned = re.sub(r',\s*}', '}', cleaned)
-                cleaned = re.sub(r',\s*]', ']', cleaned)
-                try:
-                    return json.loads(cleaned)
-                except json.JSONDecodeError:
-                    continue
+    # Try each balanced {...} span, outermost first in order of position
+    for candidate in _iter_json_spans(text):
+        parsed = _loads_with_repair(candidate)
+        if parsed is not None:
+            return parsed
     
     # Last resort: find first { and last } 
     start = text.find('{')
     end = text.rfind('}')
     if start != -1 and end != -1 and end > start:
-        potential_json = text[start:end+1]
-        try:
-            return json.loads(potential_json)
-        except json.JSONDecodeError:
-            # Try cleaning
-            cleaned = potential_json
-            cleaned = re.sub(r',\s*}', '}', cleaned)
-            cleaned = re.sub(r',\s*]', ']', cleaned)
-            try:
-                return json.loads(cleaned)
-            except json.JSONDecodeError:
-                pass
+        parsed = _loads_with_repair(text[start:end+1])
+        if parsed is not None:
+            return parsed
     
     raise ValueError("Could not extract valid JSON from LLM response")
 
@@ -143,19 +280,141 @@ def estimate_tokens(text: str) -> int:
     return len(text) // 3
 
 
-def truncate_for_holistic(text: str, max_chars: int = 5000) -> str:
+@lru_cache(maxsize=4)
+def _encoder(model: str):
+    """
+    tiktoken encoding for a model (cl100k_base if unknown), or None when
+    tiktoken is missing or its encoding can't be loaded (it is downloaded
+    on first use, so an offline host fails here).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"  [TOKENS] ⚠️ tiktoken unavailable ({e}), estimating tokens from length")
+        return None
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """Token count with tiktoken when installed, else estimate_tokens()."""
+    enc = _encoder(model)
+    if enc is None:
+        return estimate_tokens(text)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _content_chars(content: Any) -> int:
+    """
+    Length of a message's content: plain text, or the text and image URLs
+    of a list of vision parts (without building a str() of the whole list).
+    """
+    if isinstance(content, str):
+        return len(content)
+    return sum(
+        len(part.get("text", "")) + len(part.get("image_url", {}).get("url", ""))
+        for part in content
+        if isinstance(part, dict)
+    )
+
+
+def _messages_chars(messages: List[Dict]) -> int:
+    """Total content length across chat messages, for token estimates."""
+    return sum(_content_chars(m.get("content", "")) for m in messages)
+
+
+def _compact(text: str) -> str:
+    """
+    Collapse whitespace that costs tokens but carries no meaning: runs of
+    spaces/tabs within a line, trailing spaces, and extra blank lines.
+    """
+    text = _TRAILING_SPACE_RE.sub('', text)
+    text = _INLINE_SPACE_RE.sub(' ', text)
+    return _BLANK_LINES_RE.sub('\n\n', text).strip()
+
+
+@lru_cache(maxsize=8)
+def _prompt_tokens(prompt: str, model: str) -> int:
+    """Token count of a fixed prompt, computed once per prompt and model."""
+    return count_tokens(prompt, model)
+
+
+def truncate_for_holistic(text: str, max_tokens: int = 1700, model: str = "") -> str:
     """
     Truncate text intelligently for holistic evaluation.
-    Keeps beginning and end, removes middle if needed.
+    Whitespace is compacted first, then keeps beginning and end, removing
+    the middle if it is over max_tokens.
     """
-    if len(text) <= max_chars:
-        return text
+    text = _compact(text)
     
     # Keep first 60% and last 40% for better context
-    first_part = int(max_chars * 0.6)
-    last_part = max_chars - first_part
+    first_part = int(max_tokens * 0.6)
+    last_part = max_tokens - first_part
+    
+    enc = _encoder(model)
+    if enc is None:
+        max_chars = max_tokens * 3
+        if len(text) <= max_chars:
+            return text
+        first_part, last_part = first_part * 3, max_chars - first_part * 3
+        return text[:first_part] + "\n\n[...middle section truncated...]\n\n" + text[-last_part:]
+    
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
     
-    return text[:first_part] + "\n\n[...middle section truncated...]\n\n" + text[-last_part:]
+    return (
+        enc.decode(tokens[:first_part])
+        + "\n\n[...middle section truncated...]\n\n"
+        + enc.decode(tokens[-last_part:])
+    )
+
+
+def _loop_state() -> Dict[Any, Any]:
+    """Semaphores and clients belonging to the running event loop."""
+    loop = asyncio.get_running_loop()
+    state = _LOOP_STATE.get(loop)
+    if state is None:
+        # Forget loops that have finished; their unclosed clients would keep
+        # them (and their sockets) alive
+        for old_loop in [l for l in _LOOP_STATE if l.is_closed()]:
+            del _LOOP_STATE[old_loop]
+        state = _LOOP_STATE[loop] = {}
+    return state
+
+
+def _get_client(name: str, timeout: float) -> httpx.AsyncClient:
+    """Long-lived client for this loop, so connections are kept alive between calls."""
+    state = _loop_state()
+    client = state.get(name)
+    if client is None or client.is_closed:
+        client = state[name] = httpx.AsyncClient(timeout=timeout, limits=_HTTP_LIMITS)
+    return client
+
+
+def _get_groq_client(timeout: float) -> httpx.AsyncClient:
+    """Long-lived Groq client for the running event loop."""
+    return _get_client("groq_client", timeout)
+
+
+def _get_fireworks_client(timeout: float) -> httpx.AsyncClient:
+    """Long-lived Fireworks client for the running event loop."""
+    return _get_client("fireworks_client", timeout)
+
+
+async def close_http_clients():
+    """
+    Close the running loop's API clients (called on application shutdown,
+    or at the end of a script's asyncio.run()).
+    """
+    state = _loop_state()
+    for name in ("groq_client", "fireworks_client"):
+        client = state.pop(name, None)
+        if client is not None:
+            await client.aclose()
 
 
 async def call_groq_api(
@@ -192,59 +451,88 @@ async def call_groq_api(
     }
     
     # Log token estimation
-    total_chars = sum(len(str(m.get("content", ""))) for m in messages)
-    est_tokens = estimate_tokens(str(total_chars))
+    total_chars = _messages_chars(messages)
+    est_tokens = total_chars // 3  # Same 1 token ≈ 3 chars rule as estimate_tokens()
     print(f"    [TOKEN EST] ~{est_tokens} tokens (input chars: {total_chars})")
     
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        for attempt in range(max_retries):
-            try:
-                print(f"    [API] Attempt {attempt + 1}/{max_retries}...")
-                
-                response = await client.post(
-                    f"{base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return data["choices"][0]["message"]["content"]
-                
-                elif response.status_code in [429, 413]:
-                    retry_after = response.headers.get("retry-after")
-                    if retry_after:
-                        delay = int(retry_after) + 2
-                    else:
-                        delay = base_delay * (2 ** min(attempt, 4))
-                    
-                    error_type = "TPM/RPM limit" if response.status_code == 429 else "Request size limit"
-                    print(f"    [RATE LIMIT] {error_type}. Waiting {delay}s...")
-                    await asyncio.sleep(delay)
-                    continue
-                
-                elif response.status_code == 503:
-                    delay = base_delay * (2 ** min(attempt, 3))
-                    print(f"    [SERVICE] Unavailable. Waiting {delay}s...")
-                    await asyncio.sleep(delay)
-                    continue
-                
-                else:
-                    raise Exception(f"Groq API error {response.status_code}: {response.text}")
+    client = _get_groq_client(timeout)
+    for attempt in range(max_retries):
+        try:
+            print(f"    [API] Attempt {attempt + 1}/{max_retries}...")
             
-            except httpx.TimeoutException:
-                delay = base_delay * (2 ** min(attempt, 3))
-                print(f"    [TIMEOUT] Waiting {delay}s...")
+            response = await client.post(
+                f"{base_url}/chat/completions",
+                headers=headers,
+                json=payload
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                return data["choices"][0]["message"]["content"]
+            
+            elif response.status_code in [429, 413]:
+                retry_after = response.headers.get("retry-after")
+                if retry_after:
+                    delay = int(retry_after) + 2
+                else:
+                    delay = base_delay * (2 ** min(attempt, 4))
+                
+                error_type = "TPM/RPM limit" if response.status_code == 429 else "Request size limit"
+                print(f"    [RATE LIMIT] {error_type}. Waiting {delay}s...")
                 await asyncio.sleep(delay)
+                continue
             
-            except httpx.ConnectError:
+            elif response.status_code == 503:
                 delay = base_delay * (2 ** min(attempt, 3))
-                print(f"    [CONNECTION] Waiting {delay}s...")
+                print(f"    [SERVICE] Unavailable. Waiting {delay}s...")
                 await asyncio.sleep(delay)
+                continue
+            
+            else:
+                raise Exception(f"Groq API error {response.status_code}: {response.text}")
+        
+        except httpx.TimeoutException:
+            delay = base_delay * (2 ** min(attempt, 3))
+            print(f"    [TIMEOUT] Waiting {delay}s...")
+            await asyncio.sleep(delay)
+        
+        except httpx.ConnectError:
+            delay = base_delay * (2 ** min(attempt, 3))
+            print(f"    [CONNECTION] Waiting {delay}s...")
+            await asyncio.sleep(delay)
     
     raise Exception("Max retries exceeded")
 
 
+async def _read_fireworks_stream(response: httpx.Response) -> str:
+    """
+    Collect the message content of a streamed (SSE) chat completion as it
+    arrives, rather than waiting for the whole body. A malformed event
+    raises json.JSONDecodeError, so the caller retries instead of
+    returning a completion with a chunk missing.
+    """
+    parts = []
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        
+        chunk = orjson.loads(data)
+        for choice in chunk.get("choices") or ():
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                parts.append(content)
+        
+        # Log usage if available (sent with the last chunk)
+        usage = chunk.get("usage")
+        if usage:
+            print(f"    [FIREWORKS] Tokens used: {usage.get('total_tokens', 'N/A')}")
+    
+    return "".join(parts)
+
+
 async def call_fireworks_api(
     messages: List[Dict],
     config: Dict[str, Any],
@@ -264,12 +552,13 @@ async def call_fireworks_api(
     temperature = llm_config.get("temperature", 0.6)
     top_p = llm_config.get("top_p", 1)
     top_k = llm_config.get("top_k", 40)
+    stream = llm_config.get("stream", True)
     
     if not api_key:
         raise ValueError("FIREWORKS_API_KEY not set")
     
     headers = {
-        "Accept": "application/json",
+        "Accept": "text/event-stream" if stream else "application/json",
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
     }
@@ -282,27 +571,31 @@ async def call_fireworks_api(
         "presence_penalty": 0,
         "frequency_penalty": 0,
         "temperature": temperature,
-        "messages": messages
+        "messages": messages,
+        "stream": stream
     }
     
     # Log token estimation
-    total_chars = sum(len(str(m.get("content", ""))) for m in messages)
-    est_tokens = estimate_tokens(str(total_chars))
+    total_chars = _messages_chars(messages)
+    est_tokens = total_chars // 3  # Same 1 token ≈ 3 chars rule as estimate_tokens()
     print(f"    [FIREWORKS] ~{est_tokens} est. tokens (input chars: {total_chars})")
     print(f"    [FIREWORKS] Using model: {model}")
     
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        for attempt in range(max_retries):
-            try:
-                print(f"    [FIREWORKS API] Attempt {attempt + 1}/{max_retries}...")
-                
-                response = await client.post(
-                    f"{base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                
+    client = _get_fireworks_client(timeout)
+    for attempt in range(max_retries):
+        try:
+            print(f"    [FIREWORKS API] Attempt {attempt + 1}/{max_retries}...")
+            
+            async with client.stream(
+                "POST",
+                f"{base_url}/chat/completions",
+                headers=headers,
+                json=payload
+            ) as response:
                 if response.status_code == 200:
+                    if stream:
+                        return await _read_fireworks_stream(response)
+                    await response.aread()
                     data = response.json()
                     content = data["choices"][0]["message"]["content"]
                     # Log usage if available
@@ -311,72 +604,133 @@ async def call_fireworks_api(
                         print(f"    [FIREWORKS] Tokens used: {usage.get('total_tokens', 'N/A')}")
                     return content
                 
-                elif response.status_code in [429, 413]:
-                    retry_after = response.headers.get("retry-after")
-                    if retry_after:
-                        delay = int(retry_after) + 2
-                    else:
-                        delay = base_delay * (2 ** min(attempt, 4))
-                    
-                    error_type = "Rate limit" if response.status_code == 429 else "Request size limit"
-                    print(f"    [FIREWORKS RATE LIMIT] {error_type}. Waiting {delay}s...")
-                    await asyncio.sleep(delay)
-                    continue
-                
-                elif response.status_code == 503:
-                    delay = base_delay * (2 ** min(attempt, 3))
-                    print(f"    [FIREWORKS SERVICE] Unavailable. Waiting {delay}s...")
-                    await asyncio.sleep(delay)
-                    continue
-                
-                else:
-                    print(f"    [FIREWORKS ERROR] Status {response.status_code}: {response.text[:500]}")
-                    raise Exception(f"Fireworks API error {response.status_code}: {response.text}")
+                # Read the error body, then release the connection before waiting
+                await response.aread()
             
-            except httpx.TimeoutException:
-                delay = base_delay * (2 ** min(attempt, 3))
-                print(f"    [FIREWORKS TIMEOUT] Waiting {delay}s...")
+            if response.status_code in [429, 413]:
+                retry_after = response.headers.get("retry-after")
+                if retry_after:
+                    delay = int(retry_after) + 2
+                else:
+                    delay = base_delay * (2 ** min(attempt, 4))
+                
+                error_type = "Rate limit" if response.status_code == 429 else "Request size limit"
+                print(f"    [FIREWORKS RATE LIMIT] {error_type}. Waiting {delay}s...")
                 await asyncio.sleep(delay)
+                continue
             
-            except httpx.ConnectError:
+            elif response.status_code == 503:
                 delay = base_delay * (2 ** min(attempt, 3))
-                print(f"    [FIREWORKS CONNECTION] Waiting {delay}s...")
+                print(f"    [FIREWORKS SERVICE] Unavailable. Waiting {delay}s...")
                 await asyncio.sleep(delay)
+                continue
+            
+            else:
+                print(f"    [FIREWORKS ERROR] Status {response.status_code}: {response.text[:500]}")
+                raise Exception(f"Fireworks API error {response.status_code}: {response.text}")
+        
+        except httpx.TimeoutException:
+            delay = base_delay * (2 ** min(attempt, 3))
+            print(f"    [FIREWORKS TIMEOUT] Waiting {delay}s...")
+            await asyncio.sleep(delay)
+        
+        except httpx.ConnectError:
+            delay = base_delay * (2 ** min(attempt, 3))
+            print(f"    [FIREWORKS CONNECTION] Waiting {delay}s...")
+            await asyncio.sleep(delay)
+        
+        except (httpx.TransportError, json.JSONDecodeError) as e:
+            # Connection dropped mid-stream, or a broken/partial event
+            delay = base_delay * (2 ** min(attempt, 3))
+            print(f"    [FIREWORKS STREAM] {type(e).__name__}: {e}. Waiting {delay}s...")
+            await asyncio.sleep(delay)
     
     raise Exception("Fireworks API: Max retries exceeded")
 
 
+def _get_ocr_semaphore(config: Dict[str, Any]) -> asyncio.Semaphore:
+    """
+    Semaphore capping in-flight OCR page requests across all jobs on this
+    loop, at `ocr.max_concurrency` from `config`. Jobs sharing a limit share
+    a semaphore.
+    """
+    max_concurrency = config.get("ocr", {}).get("max_concurrency", 5)
+    state = _loop_state()
+    key = ("ocr_semaphore", max_concurrency)
+    if key not in state:
+        state[key] = asyncio.Semaphore(max_concurrency)
+    return state[key]
+
+
 async def extract_text_with_llm(
     pdf_path: str,
     config: Dict[str, Any],
     is_handwritten: bool = False
 ) -> str:
-    """Extract text from PDF using LLM vision (page by page)."""
-    dpi = config.get("ocr", {}).get("dpi", 200)
+    """Extract text from PDF using LLM vision (pages OCR'd concurrently)."""
+    ocr_config = config.get("ocr", {})
+    dpi = ocr_config.get("dpi", 200)
+    image_format = ocr_config.get("format", "png")
+    
+    # Only printed QP/AK renders are cached: they repeat across students,
+    # while every student sheet is unique and resume reuses its OCR text
+    cache_dir = None if is_handwritten else ocr_config.get("image_cache_dir")
     
     print(f"    Converting PDF to images...")
-    images_b64 = pdf_to_base64_images(pdf_path, dpi=dpi)
+    # Rendering is blocking work; keep it off the event loop
+    images_b64 = await asyncio.to_thread(
+        pdf_to_base64_images, pdf_path, dpi, cache_dir,
+        image_format, ocr_config.get("jpeg_quality", 85)
+    )
+    data_url_prefix = f"data:{image_mime_type(image_format)};base64,"
     
-    all_text = []
     system_prompt = get_extraction_prompt(is_handwritten)
+    semaphore = _get_ocr_semaphore(config)
     
-    for i, img_b64 in enumerate(images_b64):
-        print(f"    OCR page {i + 1}/{len(images_b64)}...")
-        
+    # One slot per page, filled as pages finish in whatever order
+    page_texts: List[Optional[str]] = [None] * len(images_b64)
+    
+    async def ocr_page(i: int, img_b64: str):
         messages = [
             {
                 "role": "user",
                 "content": [
                     {"type": "text", "text": system_prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img_b64}"}}
+                    {"type": "image_url", "image_url": {"url": data_url_prefix + img_b64}}
                 ]
             }
         ]
         
-        extracted = await call_groq_api(messages, config, max_tokens=2000)
-        all_text.append(f"--- Page {i + 1} ---\n{extracted}")
+        async with semaphore:
+            print(f"    OCR page {i + 1}/{len(images_b64)}...")
+            extracted = await call_groq_api(messages, config, max_tokens=2000)
+        page_texts[i] = f"--- Page {i + 1} ---\n{extracted}"
+    
+    tasks = [asyncio.create_task(ocr_page(i, img_b64)) for i, img_b64 in enumerate(images_b64)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # One page failed (or we were cancelled): stop the paid calls still pending
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
     
-    return "\n\n".join(all_text)
+    return "\n\n".join(page_texts)
+
+
+def _length_prefixed(text: str) -> bytes:
+    """UTF-8 bytes with an 8-byte length prefix, so hashed fields can't run together."""
+    data = text.encode("utf-8")
+    return len(data).to_bytes(8, "big") + data
+
+
+def _holistic_cache_key(model: str, prompt: str, question_text: str, answer_key_text: str, student_text: str) -> str:
+    """Content hash identifying one holistic evaluation request."""
+    sha256 = hashlib.sha256()
+    for field in (model, prompt, question_text, answer_key_text, student_text):
+        sha256.update(_length_prefixed(field))
+    return sha256.hexdigest()
 
 
 async def holistic_evaluate(
@@ -398,12 +752,43 @@ async def holistic_evaluate(
     
     # Get the holistic prompt from config
     holistic_prompt = config.get("holistic_evaluation_prompt", "")
+    llm_config = config.get("evaluation_llm", config.get("llm", {}))
+    model = llm_config.get("model", "accounts/fireworks/models/qwen3-vl-235b-a22b-thinking")
     
-    # Qwen3-VL has much larger context - increase limits significantly
-    # 32k tokens ≈ 96k chars, but we leave room for output
-    question_truncated = truncate_for_holistic(question_text, 15000)
-    answer_truncated = truncate_for_holistic(answer_key_text, 12000)
-    student_truncated = truncate_for_holistic(student_text, 15000)
+    # Same documents + model + prompt = same evaluation; reuse a cached one
+    # before paying for compaction and tokenization
+    cache_dir = llm_config.get("cache_dir")
+    cache_file = None
+    if cache_dir:
+        key = _holistic_cache_key(model, holistic_prompt, question_text, answer_key_text, student_text)
+        cache_file = Path(cache_dir) / f"{key}.json"
+        if cache_file.exists():
+            try:
+                with open(cache_file, "rb") as f:
+                    cached = _json_loads(f.read())["result"]
+                print("  [HOLISTIC] ✓ Using cached evaluation for identical inputs")
+                return cached
+            except (ValueError, KeyError, TypeError):
+                print("  [HOLISTIC] ⚠️ Ignoring unreadable cache entry")
+    
+    # Token budget for the documents: the model's context window minus the
+    # reserved output tokens, the prompt, headroom for the section headers,
+    # and room for a validation retry's feedback turn.
+    # Split 15:12:15 between question paper, answer key and student script
+    max_retries = llm_config.get("validation_retries", 2)
+    context_tokens = llm_config.get("max_tokens_per_request", 32768)
+    doc_budget = context_tokens - _HOLISTIC_OUTPUT_TOKENS - _prompt_tokens(holistic_prompt, model) - 500
+    if max_retries > 0:
+        doc_budget -= _RETRY_FEEDBACK_TOKENS
+    doc_budget = max(doc_budget, 3000)
+    question_budget = doc_budget * 15 // 42
+    answer_budget = doc_budget * 12 // 42
+    student_budget = doc_budget * 15 // 42
+    
+    # Compacts each text, then truncates only those over their token budget
+    question_truncated = truncate_for_holistic(question_text, question_budget, model)
+    answer_truncated = truncate_for_holistic(answer_key_text, answer_budget, model)
+    student_truncated = truncate_for_holistic(student_text, student_budget, model)
     
     # Build the complete prompt with all documents
     full_prompt = f"""{holistic_prompt}
@@ -436,11 +821,50 @@ NOW EVALUATE AND RETURN JSON
         {"role": "user", "content": full_prompt}
     ]
     
-    print("  [HOLISTIC] Calling Qwen3-VL (Fireworks AI) for complete evaluation...")
-    response = await call_fireworks_api(messages, config, max_tokens=8000)
+    # Malformed output is sent back with the error so the model can fix it.
+    # Only the extracted JSON (or the end of the reply when none parsed) is
+    # echoed, capped, and each retry replaces the previous feedback turn,
+    # so the request stays within the reserved budget
+    request_messages = messages
+    result = None
+    valid = False
+    for attempt in range(max_retries + 1):
+        print("  [HOLISTIC] Calling Qwen3-VL (Fireworks AI) for complete evaluation...")
+        response = await call_fireworks_api(request_messages, config, max_tokens=_HOLISTIC_OUTPUT_TOKENS)
+        
+        print("  [HOLISTIC] Parsing evaluation result...")
+        parsed = None
+        try:
+            parsed = extract_json_from_response(response)
+            result = parsed
+            HolisticResult.model_validate(result)
+            valid = True
+            break
+        except ValueError as e:
+            if attempt >= max_retries:
+                print(f"  [HOLISTIC] ✗ Output still invalid after {max_retries} retries: {e}")
+                if result is None:
+                    raise
+                break
+            print(f"  [HOLISTIC] Output invalid, retrying ({attempt + 1}/{max_retries}): {e}")
+            if parsed is not None:
+                echo = orjson.dumps(parsed).decode("utf-8")[:_RETRY_ECHO_CHARS]
+            else:
+                echo = response[-_RETRY_ECHO_CHARS:]
+            error = str(e)[:_RETRY_ERROR_CHARS]
+            request_messages = messages + [
+                {"role": "assistant", "content": echo},
+                {"role": "user", "content": f"Your output had error: {error}. Fix and retry, returning only JSON."}
+            ]
+            await asyncio.sleep(1.0 * (attempt + 1))
     
-    print("  [HOLISTIC] Parsing evaluation result...")
-    result = extract_json_from_response(response)
+    if valid and cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(cache_file, orjson.dumps({
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+            "model": model,
+            "result": result
+        }))
     
     return result
 
@@ -543,12 +967,52 @@ def save_result(job_id: str, result: Dict[str, Any], outputs_dir: str) -> str:
     outputs_path.mkdir(parents=True, exist_ok=True)
     
     output_file = outputs_path / f"{job_id}_result.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
+    try:
+        payload = orjson.dumps(result, option=orjson.OPT_INDENT_2)
+    except TypeError:
+        # Values orjson can't encode (e.g. integers over 64 bits)
+        payload = json.dumps(result, indent=2).encode("utf-8")
+    with open(output_file, "wb") as f:
+        f.write(payload)
     
     return str(output_file)
 
 
+async def get_exam_ocr_texts(
+    job_id: str,
+    exam_id: str,
+    exam_checkpoint: ExamCheckpointService,
+    question_pdf_path: str,
+    answer_key_pdf_path: str,
+    config: Dict[str, Any]
+) -> Tuple[str, str]:
+    """
+    Get QP and AK text from the exam checkpoint, running OCR and caching
+    it on first use. Returns (question_text, answer_key_text).
+    """
+    exam_ocr = exam_checkpoint.get_ocr_texts()
+    
+    if exam_ocr:
+        # EXAM CHECKPOINT EXISTS - Skip QP and AK OCR
+        print(f"[{job_id}] ✓ Using cached exam OCR for exam_id: {exam_id}")
+        print(f"[{job_id}]   Skipping question paper OCR (cached)")
+        print(f"[{job_id}]   Skipping answer key OCR (cached)")
+        return exam_ocr["question_paper"], exam_ocr["answer_key"]
+    
+    # FIRST STUDENT - Extract QP and AK, then cache
+    print(f"[{job_id}]   Processing question paper (FIRST TIME)...")
+    question_text = await extract_text_with_llm(question_pdf_path, config, is_handwritten=False)
+    
+    print(f"[{job_id}]   Processing answer key (FIRST TIME)...")
+    answer_key_text = await extract_text_with_llm(answer_key_pdf_path, config, is_handwritten=False)
+    
+    # Save to exam checkpoint for reuse by future students
+    exam_checkpoint.save_ocr_results(question_text, answer_key_text)
+    print(f"[{job_id}] ✓ Exam OCR checkpoint saved (exam_id: {exam_id})")
+    
+    return question_text, answer_key_text
+
+
 async def evaluate_exam(
     job_id: str,
     question_pdf_path: str,
@@ -567,17 +1031,29 @@ async def evaluate_exam(
     Only student answer OCR runs for each new student.
     """
     config = load_config()
-    checkpoint = CheckpointService(job_id, config.get("paths", {}).get("checkpoints", "./checkpoints"))
+    checkpoints_dir = get_checkpoints_dir()
+    checkpoint = CheckpointService(
+        job_id, checkpoints_dir,
+        fast_io=config.get("checkpoints", {}).get("fast_io", False)
+    )
     outputs_dir = config.get("paths", {}).get("outputs", "./outputs")
-    checkpoints_dir = config.get("paths", {}).get("checkpoints", "./checkpoints")
-    
-    # Generate exam_id from QP + AK file hashes (same QP+AK = same exam_id)
-    exam_id = generate_exam_id(question_pdf_path, answer_key_pdf_path)
-    exam_checkpoint = ExamCheckpointService(exam_id, checkpoints_dir)
-    
-    print(f"[{job_id}] Exam ID: {exam_id}")
     
     try:
+        # A resumed job that already finished evaluation needs no OCR or LLM calls
+        cached_final = checkpoint.get_final_result()
+        if cached_final:
+            print(f"[{job_id}] ✓ Final result already in checkpoint, skipping OCR and evaluation")
+            result_path = save_result(job_id, cached_final, outputs_dir)
+            print(f"[{job_id}] ✓ Result saved to {result_path}")
+            job_store.update_job(job_id, "completed", result=cached_final)
+            return cached_final
+        
+        # Generate exam_id from QP + AK file hashes (same QP+AK = same exam_id)
+        exam_id = await asyncio.to_thread(generate_exam_id, question_pdf_path, answer_key_pdf_path)
+        exam_checkpoint = ExamCheckpointService(exam_id, checkpoints_dir)
+        
+        print(f"[{job_id}] Exam ID: {exam_id}")
+        
         # ============ STAGE 1: OCR EXTRACTION ============
         # First check per-job checkpoint (for resume capability)
         job_ocr_texts = checkpoint.get_ocr_texts()
@@ -593,26 +1069,10 @@ async def evaluate_exam(
             job_store.update_job(job_id, "processing", error=None)
             
             # Check exam-level checkpoint for QP and AK
-            exam_ocr = exam_checkpoint.get_ocr_texts()
-            
-            if exam_ocr:
-                # EXAM CHECKPOINT EXISTS - Skip QP and AK OCR
-                print(f"[{job_id}] ✓ Using cached exam OCR for exam_id: {exam_id}")
-                print(f"[{job_id}]   Skipping question paper OCR (cached)")
-                print(f"[{job_id}]   Skipping answer key OCR (cached)")
-                question_text = exam_ocr["question_paper"]
-                answer_key_text = exam_ocr["answer_key"]
-            else:
-                # FIRST STUDENT - Extract QP and AK, then cache
-                print(f"[{job_id}]   Processing question paper (FIRST TIME)...")
-                question_text = await extract_text_with_llm(question_pdf_path, config, is_handwritten=False)
-                
-                print(f"[{job_id}]   Processing answer key (FIRST TIME)...")
-                answer_key_text = await extract_text_with_llm(answer_key_pdf_path, config, is_handwritten=False)
-                
-                # Save to exam checkpoint for reuse by future students
-                exam_checkpoint.save_ocr_results(question_text, answer_key_text)
-                print(f"[{job_id}] ✓ Exam OCR checkpoint saved (exam_id: {exam_id})")
+            question_text, answer_key_text = await get_exam_ocr_texts(
+                job_id, exam_id, exam_checkpoint,
+                question_pdf_path, answer_key_pdf_path, config
+            )
             
             # ALWAYS OCR student answers (unique per student)
             print(f"[{job_id}]   Processing student answers (handwriting recognition)...")
@@ -663,17 +1123,84 @@ async def evaluate_exam(
     except Exception as e:
         error_msg = str(e)
         print(f"[{job_id}] ❌ Error: {error_msg}")
+        checkpoint.flush()
         print(f"[{job_id}] 💾 Progress saved in checkpoint - can resume later")
         job_store.update_job(job_id, "failed", error=error_msg)
         raise
 
 
+async def evaluate_exam_batch(
+    job_specs: List[Tuple[str, str, str, str]]
+) -> List[Any]:
+    """
+    Evaluate several students concurrently.
+    
+    Each spec is (job_id, question_pdf_path, answer_key_pdf_path,
+    student_pdf_path). QP/AK OCR runs once per exam before the students
+    fan out, so every student pipeline hits the exam checkpoint; at most
+    `batch.max_concurrent_students` students are evaluated at a time.
+    
+    Returns:
+        One entry per spec, in order: the final result, or the exception
+        that failed that student's evaluation
+    """
+    config = load_config()
+    checkpoints_dir = get_checkpoints_dir()
+    
+    for job_id, _, _, _ in job_specs:
+        if job_store.get_job(job_id) is None:
+            job_store.create_job(job_id)
+    
+    # One-time QP/AK OCR per distinct exam. If it fails, that exam's jobs
+    # are marked failed (so they can be resumed) instead of left processing
+    warm_errors: Dict[str, Exception] = {}
+    spec_errors: List[Optional[Exception]] = []
+    warmed = set()
+    for job_id, question_pdf_path, answer_key_pdf_path, _ in job_specs:
+        try:
+            exam_id = await asyncio.to_thread(generate_exam_id, question_pdf_path, answer_key_pdf_path)
+            if exam_id in warm_errors:
+                raise warm_errors[exam_id]
+            if exam_id not in warmed:
+                try:
+                    await get_exam_ocr_texts(
+                        job_id, exam_id, ExamCheckpointService(exam_id, checkpoints_dir),
+                        question_pdf_path, answer_key_pdf_path, config
+                    )
+                except Exception as e:
+                    warm_errors[exam_id] = e
+                    raise
+                warmed.add(exam_id)
+            spec_errors.append(None)
+        except Exception as e:
+            print(f"[{job_id}] ❌ Error: {e}")
+            job_store.update_job(job_id, "failed", error=str(e))
+            spec_errors.append(e)
+    
+    max_students = config.get("batch", {}).get("max_concurrent_students", 4)
+    semaphore = asyncio.Semaphore(max_students)
+    
+    async def student_pipeline(spec: Tuple[str, str, str, str]) -> Dict[str, Any]:
+        async with semaphore:
+            return await evaluate_exam(*spec)
+    
+    results = await asyncio.gather(
+        *(student_pipeline(spec) for spec, error in zip(job_specs, spec_errors) if error is None),
+        return_exceptions=True
+    )
+    evaluated = iter(results)
+    return [error if error is not None else next(evaluated) for error in spec_errors]
+
+
 async def resume_evaluation(job_id: str) -> Dict[str, Any]:
     """
     Resume a failed or interrupted evaluation from its checkpoint.
     """
     config = load_config()
-    checkpoint = CheckpointService(job_id, config.get("paths", {}).get("checkpoints", "./checkpoints"))
+    checkpoint = CheckpointService(
+        job_id, get_checkpoints_dir(),
+        fast_io=config.get("checkpoints", {}).get("fast_io", False)
+    )
     
     existing = checkpoint.load()
     if not existing:
@@ -700,6 +1227,15 @@ async def resume_evaluation(job_id: str) -> Dict[str, Any]:
     )
 
 
+def _get_job_semaphore() -> asyncio.Semaphore:
+    """Semaphore capping how many evaluation jobs run at once on the event loop."""
+    state = _loop_state()
+    if "job_semaphore" not in state:
+        max_concurrent = load_config().get("jobs", {}).get("max_concurrent", 4)
+        state["job_semaphore"] = asyncio.Semaphore(max_concurrent)
+    return state["job_semaphore"]
+
+
 async def run_evaluation_task(
     job_id: str,
     question_pdf_path: str,
@@ -708,6 +1244,16 @@ async def run_evaluation_task(
 ):
     """Background task wrapper."""
     try:
-        await evaluate_exam(job_id, question_pdf_path, answer_key_pdf_path, student_pdf_path)
+        async with _get_job_semaphore():
+            await evaluate_exam(job_id, question_pdf_path, answer_key_pdf_path, student_pdf_path)
     except Exception as e:
         print(f"[{job_id}] Background task failed: {e}")
+
+
+async def run_resume_task(job_id: str):
+    """Background task wrapper for resume."""
+    try:
+        async with _get_job_semaphore():
+            await resume_evaluation(job_id)
+    except Exception as e:
+        print(f"[{job_id}] Resume task failed: {e}")
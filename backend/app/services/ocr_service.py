@@ -5,17 +5,128 @@ Converts PDF pages to images and uses the LLM for text extraction.
 import fitz  # PyMuPDF
 import base64
 import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
+import orjson
 
-def pdf_to_base64_images(pdf_path: str, dpi: int = 200) -> List[str]:
+from .checkpoint_service import _checkpoint_dir
+from .exam_checkpoint_service import compute_file_hash
+from .file_utils import write_atomic
+
+
+_PROMPT_HANDWRITTEN = """You are an expert OCR system specialized in reading handwritten text.
+Extract ALL text from this image exactly as written. 
+- Preserve the original structure (headings, paragraphs, numbered lists)
+- Include question numbers like A1, B2, (i), (ii), etc.
+- If text is unclear, make your best guess based on context
+- Do NOT add any commentary or explanation
+- Output ONLY the extracted text"""
+
+_PROMPT_PRINTED = """You are an expert OCR system.
+Extract ALL text from this image exactly as written.
+- Preserve the original structure (headings, sections, numbering)
+- Include all question numbers, marks allocation, and instructions
+- Do NOT add any commentary or explanation  
+- Output ONLY the extracted text"""
+
+# Extraction prompt by is_handwritten
+_PROMPTS = {True: _PROMPT_HANDWRITTEN, False: _PROMPT_PRINTED}
+
+# Below this many pages, rendering in-process beats handing pages to workers
+PARALLEL_RENDER_MIN_PAGES = 3
+
+# Worker processes shared by every render, across all jobs
+RENDER_MAX_WORKERS = min(os.cpu_count() or 1, 4)
+
+# Created lazily by _get_render_executor(), closed by shutdown_render_executor()
+_RENDER_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_RENDER_EXECUTOR_LOCK = threading.Lock()
+
+
+def _render(page: fitz.Page, dpi: int, image_format: str = "png", jpeg_quality: int = 85) -> str:
+    """Render one page to a base64-encoded PNG or JPEG."""
+    # Render page to image at specified DPI
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    pix = page.get_pixmap(matrix=mat)
+    
+    # Convert to image bytes; JPEG is far smaller and reads the same for OCR
+    if image_format == "jpeg":
+        img_bytes = pix.tobytes("jpeg", jpg_quality=jpeg_quality)
+    else:
+        img_bytes = pix.tobytes("png")
+    # Free the raw pixels, the largest buffer, before encoding
+    del pix
+    
+    # Encode as base64 (always ASCII), dropping the image bytes before the str copy
+    encoded = base64.b64encode(img_bytes)
+    del img_bytes
+    return encoded.decode("ascii")
+
+
+def _render_page(pdf_path: str, page_num: int, dpi: int, image_format: str, jpeg_quality: int) -> str:
+    """Render one page in a worker process, which opens its own document."""
+    with fitz.open(pdf_path) as doc:
+        return _render(doc[page_num], dpi, image_format, jpeg_quality)
+
+
+def _get_render_executor() -> ProcessPoolExecutor:
+    """
+    Process pool for page rendering, shared across jobs. Workers are spawned
+    rather than forked, since renders are started from a threaded server.
     """
-    Convert PDF pages to base64-encoded PNG images.
+    global _RENDER_EXECUTOR
+    with _RENDER_EXECUTOR_LOCK:
+        if _RENDER_EXECUTOR is None:
+            _RENDER_EXECUTOR = ProcessPoolExecutor(
+                max_workers=RENDER_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _RENDER_EXECUTOR
+
+
+def shutdown_render_executor():
+    """Stop the render worker processes (on app shutdown)."""
+    global _RENDER_EXECUTOR
+    with _RENDER_EXECUTOR_LOCK:
+        executor, _RENDER_EXECUTOR = _RENDER_EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def normalize_image_format(image_format: str) -> str:
+    """Map a configured image format to "png" or "jpeg"."""
+    return "jpeg" if image_format.lower() in ("jpeg", "jpg") else "png"
+
+
+def image_mime_type(image_format: str) -> str:
+    """MIME type for data URLs of images rendered in `image_format`."""
+    return f"image/{normalize_image_format(image_format)}"
+
+
+def pdf_to_base64_images(
+    pdf_path: str,
+    dpi: int = 200,
+    cache_dir: Optional[str] = None,
+    image_format: str = "png",
+    jpeg_quality: int = 85
+) -> List[str]:
+    """
+    Convert PDF pages to base64-encoded PNG or JPEG images.
     
     Args:
         pdf_path: Path to the PDF file
         dpi: Resolution for rendering PDF pages
+        cache_dir: If set, rendered pages are cached here keyed by the PDF's
+            content hash and render settings, so the same PDF is only rendered once
+        image_format: "png" or "jpeg"
+        jpeg_quality: JPEG quality (1-100), used when image_format is "jpeg"
     
     Returns:
         List of base64-encoded image strings
@@ -24,27 +135,44 @@ def pdf_to_base64_images(pdf_path: str, dpi: int = 200) -> List[str]:
     if not pdf_path.exists():
         raise FileNotFoundError(f"PDF file not found: {pdf_path}")
     
-    images = []
-    doc = fitz.open(str(pdf_path))
+    image_format = normalize_image_format(image_format)
     
-    try:
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            
-            # Render page to image at specified DPI
-            mat = fitz.Matrix(dpi / 72, dpi / 72)
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PNG bytes
-            img_bytes = pix.tobytes("png")
-            
-            # Encode as base64
-            b64_string = base64.standard_b64encode(img_bytes).decode("utf-8")
-            images.append(b64_string)
+    cache_file = None
+    if cache_dir:
+        cache_key = f"{compute_file_hash(str(pdf_path))}_{dpi}"
+        if image_format == "jpeg":
+            cache_key += f"_jpeg{jpeg_quality}"
+        cache_file = _checkpoint_dir(cache_dir) / f"{cache_key}.json"
+        if cache_file.exists():
+            with open(cache_file, "rb") as f:
+                return orjson.loads(f.read())
     
+    doc = fitz.open(str(pdf_path))
+    try:
+        n_pages = len(doc)
+        if n_pages < PARALLEL_RENDER_MIN_PAGES:
+            images = [
+                _render(doc[page_num], dpi, image_format, jpeg_quality)
+                for page_num in range(n_pages)
+            ]
     finally:
         doc.close()
     
+    if n_pages >= PARALLEL_RENDER_MIN_PAGES:
+        # Rasterizing is CPU-bound; spread pages across the worker processes
+        try:
+            images = list(_get_render_executor().map(
+                _render_page, repeat(str(pdf_path)), range(n_pages), repeat(dpi),
+                repeat(image_format), repeat(jpeg_quality)
+            ))
+        except BrokenProcessPool:
+            # A worker died; drop the pool so the next render starts a fresh one
+            shutdown_render_executor()
+            raise
+    
+    if cache_file is not None:
+        write_atomic(cache_file, orjson.dumps(images))
+    
     return images
 
 
@@ -52,18 +180,4 @@ def get_extraction_prompt(is_handwritten: bool = False) -> str:
     """
     Get the system prompt for text extraction.
     """
-    if is_handwritten:
-        return """You are an expert OCR system specialized in reading handwritten text.
-Extract ALL text from this image exactly as written. 
-- Preserve the original structure (headings, paragraphs, numbered lists)
-- Include question numbers like A1, B2, (i), (ii), etc.
-- If text is unclear, make your best guess based on context
-- Do NOT add any commentary or explanation
-- Output ONLY the extracted text"""
-    else:
-        return """You are an expert OCR system.
-Extract ALL text from this image exactly as written.
-- Preserve the original structure (headings, sections, numbering)
-- Include all question numbers, marks allocation, and instructions
-- Do NOT add any commentary or explanation  
-- Output ONLY the extracted text"""
+    return _PROMPTS[bool(is_handwritten)]
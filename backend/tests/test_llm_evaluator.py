@@ -0,0 +1,38 @@
+"""
+Tests for JSON extraction from LLM responses.
+"""
+import time
+
+import pytest
+
+from app.services.llm_evaluator import extract_json_from_response
+
+
+def test_extract_json_after_prose_with_quoted_unbalanced_brace():
+    """A quoted, unclosed { in the reasoning must not hide the JSON after it."""
+    text = (
+        'The student wrote "for(i=0;i<n;i++) {" and never closed the loop...\n'
+        '{"section_wise_evaluation": {"A": {"section_total": 4}}, '
+        '"final_summary": {"total_marks": 4, "result": "FAIL"}}'
+    )
+    result = extract_json_from_response(text)
+    assert result["section_wise_evaluation"]["A"]["section_total"] == 4
+    assert result["final_summary"]["result"] == "FAIL"
+
+
+def test_extract_json_with_braces_inside_strings_and_trailing_comma():
+    text = 'Thinking {draft} done.\n{"remarks": "uses } and { in code", "marks": [1, 2,],}'
+    assert extract_json_from_response(text) == {"remarks": "uses } and { in code", "marks": [1, 2]}
+
+
+def test_extract_json_raises_without_json():
+    with pytest.raises(ValueError):
+        extract_json_from_response("no json { here")
+
+
+def test_extract_json_after_many_unclosed_braces_is_linear():
+    """A long run of unclosed braces must not be rescanned from every brace."""
+    text = '{' * 50000 + '{"a": 1}'
+    started = time.perf_counter()
+    assert extract_json_from_response(text) == {"a": 1}
+    assert time.perf_counter() - started < 1.0